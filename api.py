@@ -0,0 +1,211 @@
+# ------------------  api.py  ------------------
+"""API HTTP local de solo lectura sobre el journal (bots, widgets…).
+
+    python api.py --creds sa.json               # http://127.0.0.1:8765
+    curl localhost:8765/trades?from=2024-05-01&symbol=EURUSD
+
+Endpoints: ``/kpis``, ``/trades?from=&to=&symbol=``, ``/equity``,
+``/impressions``. Usa el mismo snapshot / TradeStore que los dashboards (todas
+las pestañas en un request, con una versión conjunta) y
+el código de ``report.py`` para los KPIs; las respuestas se cachean en
+memoria por versión de datos y llevan ``ETag``: un poll con
+``If-None-Match`` que no cambió responde 304 sin tocar los datos.
+"""
+import argparse, hashlib, json, os, sys, threading, time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+import pandas as pd
+
+import snapshot
+from journal_store import SHEET_KEY, JOURNAL_TAB, IMP_TAB, TradeStore
+from kpis import INITIAL_CAP, real_trades, equity_curve, drawdown
+from report import SCOPES, build_report
+
+CACHE_ENTRIES = 256
+
+
+def _etag(*parts) -> str:
+    return '"' + hashlib.blake2b("\x1f".join(map(str, parts)).encode(),
+                                 digest_size=8).hexdigest() + '"'
+
+def _records(df: pd.DataFrame) -> bytes:
+    return df.to_json(orient="records", date_format="iso").encode()
+
+
+class JournalAPI:
+    """Datos + caché de respuestas; independiente del servidor HTTP."""
+
+    def __init__(self, ws, key: str = SHEET_KEY,
+                 initial_cap: float = INITIAL_CAP,
+                 max_age: float = snapshot.REVALIDATE_S):
+        self.ws, self.key = ws, key
+        self.initial_cap, self.max_age = initial_cap, max_age
+        self.store = TradeStore(ws)
+        # (versión, {pestaña: DataFrame}): se reemplazan juntos, nunca por partes
+        self._data, self._loaded = ("", None), 0.0
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()      # LRU (versión, ruta, query) -> body
+        self._cache_lock = threading.Lock()
+        self.stats = {"requests": 0, "not_modified": 0, "built": 0}
+
+    # ---------- datos ----------
+    def data(self):
+        """(versión, {pestaña: df}) vigentes; recarga del snapshot si otro
+        proceso lo cambió."""
+        info = snapshot.stamp(self.key)
+        if not self._stale(info):
+            if info and time.time() - info.get("checked", 0) > self.max_age:
+                snapshot.revalidate(self.ws, self.key, backfill=False)
+            return self._data
+        with self._lock:
+            if self._stale(info):
+                frames, version, _ = snapshot.load(self.store, self.key,
+                                                   backfill=False,
+                                                   max_age=self.max_age)
+                self._data, self._loaded = (version, frames), time.time()
+        return self._data
+
+    def journal(self):
+        """(versión, df de trades)."""
+        version, frames = self.data()
+        return version, frames[JOURNAL_TAB]
+
+    def _stale(self, info) -> bool:
+        if self._data[1] is None:
+            return True
+        if info is None:         # sin snapshot en disco: releer cada max_age
+            return time.time() - self._loaded > self.max_age
+        return info.get("version") != self._data[0]
+
+    # ---------- endpoints ----------
+    def _kpis(self, df, q):
+        rep = build_report(df, self.initial_cap)
+        return json.dumps({k: (v.to_dict(orient="records")
+                               if isinstance(v, pd.DataFrame) else v)
+                           for k, v in rep.items()}, default=float).encode()
+
+    def _trades(self, df, q):
+        if df.empty:
+            return b"[]"
+        if "from" in q:
+            df = df[df["Datetime"] >= pd.Timestamp(q["from"])]
+        if "to" in q:
+            to = pd.Timestamp(q["to"])
+            df = df[df["Datetime"] < (to + pd.Timedelta(days=1)
+                                      if to == to.normalize() else to)]
+        if "symbol" in q:
+            syms = {s.strip().upper() for s in q["symbol"].split(",")}
+            df = df[df["Symbol"].astype(str).str.upper().isin(syms)]
+        return _records(df.sort_values("Datetime"))
+
+    def _equity(self, df, q):
+        if df.empty:
+            return b"[]"
+        eq = equity_curve(real_trades(df), self.initial_cap)
+        eq["Drawdown"] = drawdown(eq["Equity"])
+        return _records(eq[["Datetime", "TradeID", "USD", "Equity", "Drawdown"]])
+
+    def _impressions(self, df, q):
+        return _records(df)
+
+    # ruta -> (método, parámetros, pestaña)
+    ROUTES = {"/kpis":        ("_kpis", (), JOURNAL_TAB),
+              "/trades":      ("_trades", ("from", "to", "symbol"), JOURNAL_TAB),
+              "/equity":      ("_equity", (), JOURNAL_TAB),
+              "/impressions": ("_impressions", (), IMP_TAB)}
+
+    def handle(self, url: str, if_none_match: str = None):
+        """(status, headers, body) para un GET."""
+        self.stats["requests"] += 1
+        parts = urlsplit(url)
+        route = self.ROUTES.get(parts.path.rstrip("/") or "/")
+        if route is None:
+            return 404, {}, json.dumps({"error": "not found",
+                                        "endpoints": list(self.ROUTES)}).encode()
+        fn, params, tab = route
+        q = {k: v for k, v in parse_qsl(parts.query) if k in params and v}
+        qkey = tuple(sorted(q.items()))
+        try:
+            ver, frames = self.data()
+            df = frames[tab]
+        except Exception as e:           # hoja caída y sin snapshot
+            return 503, {}, json.dumps({"error": str(e)}).encode()
+        tag = _etag(ver, fn, qkey)
+        headers = {"ETag": tag, "X-Data-Version": ver, "Cache-Control": "no-cache"}
+        if if_none_match and tag in {t.strip() for t in if_none_match.split(",")}:
+            self.stats["not_modified"] += 1
+            return 304, headers, b""
+
+        ck = (ver, fn, qkey)
+        with self._cache_lock:
+            body = self._cache.get(ck)
+            if body is not None:
+                self._cache.move_to_end(ck)
+        if body is None:
+            try:
+                body = getattr(self, fn)(df, q)
+            except (ValueError, TypeError) as e:      # fechas mal formadas
+                return 400, {}, json.dumps({"error": str(e)}).encode()
+            with self._cache_lock:
+                self._cache[ck] = body
+                self.stats["built"] += 1
+                while len(self._cache) > CACHE_ENTRIES:
+                    self._cache.popitem(last=False)
+        return 200, headers, body
+
+
+# ---------- servidor ----------
+def make_server(api: JournalAPI, host: str = "127.0.0.1", port: int = 8765):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"          # keep-alive para los pollers
+
+        def do_GET(self):
+            status, headers, body = api.handle(self.path,
+                                               self.headers.get("If-None-Match"))
+            self.send_response(status)
+            if status != 304:
+                self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in headers.items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):          # sin una línea por request
+            pass
+
+    srv = ThreadingHTTPServer((host, port), Handler)
+    srv.daemon_threads = True
+    return srv
+
+
+def open_sheet(key: str, creds_path: str):
+    """Worksheet de trades; el resto de pestañas se lee por ``ws.spreadsheet``."""
+    import gspread
+    from google.oauth2.service_account import Credentials
+    creds = Credentials.from_service_account_file(creds_path, scopes=SCOPES)
+    return gspread.authorize(creds).open_by_key(key).worksheet(JOURNAL_TAB)
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--key", default=SHEET_KEY)
+    ap.add_argument("--initial-cap", type=float, default=INITIAL_CAP)
+    ap.add_argument("--creds", default=os.environ.get("GOOGLE_APPLICATION_CREDENTIALS"),
+                    help="JSON de la service account")
+    args = ap.parse_args(argv)
+
+    ws = open_sheet(args.key, args.creds)
+    srv = make_server(JournalAPI(ws, args.key, args.initial_cap),
+                      args.host, args.port)
+    print(f"API en http://{args.host}:{args.port} · {', '.join(JournalAPI.ROUTES)}")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
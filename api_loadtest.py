@@ -0,0 +1,128 @@
+# ------------------  api_loadtest.py  ------------------
+"""Prueba de carga de ``api.py`` contra una hoja falsa en memoria.
+
+    python api_loadtest.py                       # 8 clientes × 500 requests
+    python api_loadtest.py -c 32 -n 2000 --rows 20000 --no-etag
+
+Cada cliente hace polls con keep-alive y reenvía el último ``ETag``
+(``If-None-Match``); a mitad de la prueba se modifica la hoja para medir
+cuánto tarda en propagarse la versión nueva. Al final: requests/s,
+latencias p50 / p95 por status y cuántos requests llegaron a la "hoja"
+(uno por refresco, con todas las pestañas).
+"""
+import argparse, http.client, random, statistics, tempfile, threading, time
+from pathlib import Path
+import numpy as np
+
+import snapshot
+from journal_store import HEADER, JOURNAL_TAB, IMP_TAB, IMP_HEADER
+from api import JournalAPI, make_server
+
+PATHS = ["/kpis", "/equity", "/impressions", "/trades",
+         "/trades?symbol=EURUSD", "/trades?from=2024-03-01&to=2024-03-31"]
+
+
+class FakeSpreadsheet:
+    """Lo mínimo de ``gspread.Spreadsheet`` que usa la API, contando requests."""
+
+    def __init__(self, tabs):
+        self.tabs, self.reads = tabs, 0
+
+    def values_batch_get(self, ranges):
+        self.reads += 1
+        time.sleep(0.3)                      # latencia típica de Sheets
+        return {"valueRanges": [
+            {"range": r, "values": [list(x) for x in self.tabs[r.split("'")[1]]]}
+            for r in ranges]}
+
+class FakeWorksheet:
+    def __init__(self, sh, tab):
+        self.spreadsheet, self.rows = sh, sh.tabs[tab]
+
+def fake_journal(n: int, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    dt = np.datetime64("2024-01-01T08:00") + np.arange(n) * np.timedelta64(5, "h")
+    res = rng.choice(["Win", "Loss", "BE"], n, p=[.4, .5, .1])
+    vol = rng.uniform(.5, 3, n).round(2)
+    gross = np.where(res == "Win", rng.uniform(100, 600, n),
+                     np.where(res == "Loss", -rng.uniform(100, 200, n), 0)).round(2)
+    rows = [HEADER]
+    for i in range(n):
+        d = dict.fromkeys(HEADER, "")
+        comm = round(vol[i] * 4, 2)
+        d.update({"Fecha": str(dt[i])[:10], "Hora": str(dt[i])[11:16] + ":00",
+                  "Symbol": rng.choice(["EURUSD", "GBPUSD", "XAUUSD"]),
+                  "Type": "Long", "Volume": str(vol[i]), "Ticket": str(100000 + i),
+                  "Win/Loss/BE": res[i], "Gross_USD": str(gross[i]),
+                  "Commission": str(comm), "USD": str(round(gross[i] - comm, 2)),
+                  "R": str(round((gross[i] - comm) / 150, 2)), "Resolved": "No",
+                  "IsIdeaOnly": "No", "TradeID": f"T{i:011x}"})
+        rows.append([d[c] for c in HEADER])
+    return rows
+
+
+def client(port, n, use_etag, out):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    etags = {}
+    for _ in range(n):
+        path = random.choice(PATHS)
+        hdr = {"If-None-Match": etags[path]} if use_etag and path in etags else {}
+        t0 = time.perf_counter()
+        conn.request("GET", path, headers=hdr)
+        r = conn.getresponse(); body = r.read()
+        out.append((r.status, time.perf_counter() - t0, len(body),
+                    path, r.getheader("X-Data-Version")))
+        if r.getheader("ETag"):
+            etags[path] = r.getheader("ETag")
+    conn.close()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("-c", "--clients", type=int, default=8)
+    ap.add_argument("-n", "--requests", type=int, default=500, help="por cliente")
+    ap.add_argument("--rows", type=int, default=5000)
+    ap.add_argument("--no-etag", action="store_true")
+    args = ap.parse_args(argv)
+
+    snapshot.SNAP_DIR = Path(tempfile.mkdtemp(prefix="qj_snap_"))
+    sh = FakeSpreadsheet({
+        JOURNAL_TAB: fake_journal(args.rows),
+        IMP_TAB: [IMP_HEADER] + [[f"2024-01-{d:02d}", "ok", "", "Yes", ""]
+                                 for d in range(1, 29)]})
+    ws  = FakeWorksheet(sh, JOURNAL_TAB)
+    api = JournalAPI(ws, key="LOADTEST", max_age=0.5)
+    srv = make_server(api, port=0)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    port = srv.server_address[1]
+
+    old = api.journal()[0]                   # arranque en frío: primera lectura
+    out = []
+    t0 = time.perf_counter()
+    cl = [threading.Thread(target=client, args=(port, args.requests,
+                                                not args.no_etag, out))
+          for _ in range(args.clients)]
+    for t in cl: t.start()
+    # a mitad de la prueba alguien edita la hoja
+    time.sleep(0.2)
+    ws.rows[1][HEADER.index("Comentarios")] = "editado"
+    for t in cl: t.join()
+    wall = time.perf_counter() - t0
+    srv.shutdown()
+
+    print(f"{len(out):,} requests en {wall:.2f}s → {len(out)/wall:,.0f} req/s "
+          f"({args.clients} clientes, {args.rows:,} trades, "
+          f"etag={'no' if args.no_etag else 'sí'})")
+    for status in sorted({s for s, *_ in out}):
+        lat = sorted(1000 * l for s, l, *_ in out if s == status)
+        print(f"  {status}: {len(lat):6,}  p50 {statistics.median(lat):6.2f} ms  "
+              f"p95 {lat[int(.95*(len(lat)-1))]:6.2f} ms")
+    mb = sum(b for _, _, b, *_ in out) / 1e6
+    new = sum(1 for *_, v in out if v and v != old)
+    print(f"  bytes enviados: {mb:,.1f} MB · cuerpos construidos: {api.stats['built']}"
+          f" · requests a la hoja: {sh.reads}")
+    print(f"  respuestas con la versión nueva tras la edición: {new:,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,118 +1,77 @@
 # ------------------  app.py  ------------------
-import streamlit as st, pandas as pd, numpy as np, math, re, time, random
+import streamlit as st, pandas as pd, re
 import plotly.express as px, plotly.graph_objects as go
 from datetime import datetime, timedelta
 from google.oauth2.service_account import Credentials
 import gspread
-from gspread.exceptions import APIError
+from journal_store import (SHEET_KEY, HEADER, ID_COL, HOT_COLS, COLD_COLS,
+                           JOURNAL_TAB, IMP_TAB, IMP_HEADER, with_retry,
+                           ensure_tabs, TradeStore, ConflictError)
+from kpis import (INITIAL_CAP, true_commission, calc_r, real_trades,
+                  kpi_summary, equity_curve)
+from reconcile import (read_mt5_report, reconcile, propose_corrections,
+                       missing_rows)
+from rolling import rolling_frame, METRICS as ROLLING_METRICS
+from rules import RuleEngine, DEFAULT_RULES, RULE_NAMES
+from panels import (lazy_panel, cached, flash, show_flash, start_profiler,
+                    step, chart, perf_sidebar, load_journal, fields)
 
 # ---------- Conexión ----------
 st.set_page_config("Quantitative Journal – Ingreso / KPIs", layout="wide")
+start_profiler("app")
 
 creds = Credentials.from_service_account_info(
     st.secrets["quantitative_journal"],
     scopes=["https://www.googleapis.com/auth/spreadsheets",
             "https://www.googleapis.com/auth/drive"])
 
-def with_retry(fn, *args, **kwargs):
-    """Ejecuta fn con reintento exponencial (máx 3)."""
-    for attempt in range(3):
-        try:
-            return fn(*args, **kwargs)
-        except APIError as e:
-            if attempt == 2:
-                raise
-            wait = 1.5 * (2 ** attempt) + random.uniform(0, 0.5)
-            time.sleep(wait)
-
 gc = gspread.authorize(creds)
 
-def open_ws(sheet_key:str, tab:str):
+@st.cache_resource(show_spinner=False)       # una vez por proceso
+def open_sheet(sheet_key:str):
     sh = with_retry(gc.open_by_key, sheet_key)
-    try:
-        return sh.worksheet(tab)
-    except gspread.exceptions.WorksheetNotFound:
-        ws_new = with_retry(sh.add_worksheet, tab, rows=1000, cols=20)
-        return ws_new
+    ensure_tabs(sh)                   # crea las pestañas del registro que falten
+    return sh
 
-ws = open_ws("1D4AlYBD1EClp0gGe0qnxr8NeGMbpSvdOx8yHimQDmbE", "sheet1")
-
-HEADER = [
-    "Fecha","Hora","Symbol","Type","Volume","Ticket","Win/Loss/BE",
-    "Gross_USD","Commission","USD","R","Screenshot","Comentarios",
-    "Post-Analysis","EOD","ErrorCategory","Resolved","SecondTradeValid?",
-    "LossTradeReviewURL","IdeaMissedURL","IsIdeaOnly","BEOutcome"
-]
+@st.cache_resource(show_spinner=False)
+def open_ws(sheet_key:str, tab:str):
+    return with_retry(open_sheet(sheet_key).worksheet, tab)
 
-# -- fuerza cabecera --
-if with_retry(ws.row_values, 1) != HEADER:
-    with_retry(ws.update, "A1", [HEADER])
+ws = open_ws(SHEET_KEY, JOURNAL_TAB)
+store = TradeStore(ws)
 
 # ---------- Helpers ----------
-initial_cap = 60000
-
-def true_commission(vol: float) -> float:
-    return round(vol * 4.0, 2)
-
-def calc_r(net: float) -> float:
-    risk = initial_cap * 0.0025
-    return round(net / risk, 2) if risk else 0
-
-def get_all():
-    data = with_retry(ws.get_all_records)
-    df = pd.DataFrame(data)
-    if not df.empty:
-        df["Datetime"] = pd.to_datetime(df["Fecha"]+" "+df["Hora"],
-                                        errors="coerce")
-    return df
-
-def col_letter(n:int) -> str:
-    s=""
-    while n:
-        n, r = divmod(n-1, 26)
-        s = chr(65+r)+s
-    return s
+initial_cap = INITIAL_CAP
+
+# filas con TradeID estable; el mapa ID → fila queda en `store`.
+# Se pinta desde el snapshot local y la hoja (todas las pestañas del
+# registro, cabeceras incluidas, en un solo request) se revalida aparte.
+# En memoria solo las columnas calientes: texto libre y URLs se piden por
+# trade (editor) o por panel (historial) con ``fields``.
+frames = load_journal(store, SHEET_KEY, columns=HOT_COLS)
+df = frames[JOURNAL_TAB]
+ver = store.version           # clave de caché de todas las secciones
+st.title("Quantitative Journal · Registro & Métricas")
+show_flash()
 
-def update_row(i:int, d:dict):
-    row  = i + 2
-    last = col_letter(len(HEADER))
-    vals = [[d.get(c,"") for c in HEADER]]
-    with_retry(ws.update, f"A{row}:{last}{row}", vals)
+def _kpi_data(df):
+    df_real = real_trades(df)
+    return df_real, kpi_summary(df_real, initial_cap), equity_curve(df_real, initial_cap)
 
-df = get_all()
-st.title("Quantitative Journal · Registro & Métricas")
+def _rules_engine():
+    """Reglas evaluadas sobre todo el historial (cacheado por versión + config)."""
+    cfg = st.session_state.get("rules_cfg", {})
+    df_real = cached(ver, "kpis", _kpi_data, df)[0]
+    return cached(ver, f"rules:{sorted(cfg.items())}", RuleEngine.from_history,
+                  df_real, initial_cap, cfg)
 
 
 # ======================================================
 # 📅 · Daily Impressions  (calendario + formulario)
 # ======================================================
-with st.expander("📅 Daily Impressions", expanded=False):
-
-    IMP_HEADER = ["Fecha", "Impression", "Reflection",
-                  "Good?", "ImageURLs"]              # cabecera fija
-
-    # ---------- obtener / crear hoja ----------
-    try:
-        ws_imp = gspread.authorize(creds)\
-                 .open_by_key("1D4AlYBD1EClp0gGe0qnxr8NeGMbpSvdOx8yHimQDmbE")\
-                 .worksheet("daily_impressions")
-    except gspread.exceptions.WorksheetNotFound:
-        ws_imp = ws.add_worksheet("daily_impressions", rows=1000, cols=10)
-        ws_imp.append_row(IMP_HEADER)
-
-    # ---------- fuerza cabecera correcta (con retry) ----------
-    try:
-        if ws_imp.row_values(1) != IMP_HEADER:
-            ws_imp.update("A1", [IMP_HEADER])
-    except gspread.exceptions.APIError:
-        time.sleep(1.5)
-        if ws_imp.row_values(1) != IMP_HEADER:
-            ws_imp.update("A1", [IMP_HEADER])
-
-    # ---------- DataFrame (si no hay filas, crea columnas vacías) ----------
-    imp_records = ws_imp.get_all_records()
-    imp_df = (pd.DataFrame(imp_records)
-              if imp_records else pd.DataFrame(columns=IMP_HEADER))
+def _panel_impressions():
+    # la pestaña ya viene en `frames` (mismo request que los trades)
+    imp_df = frames[IMP_TAB].copy()
     if not imp_df.empty:
         imp_df["Fecha"] = pd.to_datetime(imp_df["Fecha"]).dt.strftime("%Y-%m-%d")
 
@@ -124,7 +83,7 @@ with st.expander("📅 Daily Impressions", expanded=False):
     def _shift(delta):
         ym = datetime(y, m, 1) + pd.DateOffset(months=delta)
         st.session_state["imp_y"], st.session_state["imp_m"] = ym.year, ym.month
-        st.experimental_rerun()
+        st.rerun(scope="fragment")
 
     nav1, nav2, nav3, nav4, nav5 = st.columns([1,1,3,1,1])
     if nav1.button("⏮"): _shift(-12)
@@ -135,32 +94,33 @@ with st.expander("📅 Daily Impressions", expanded=False):
     if nav5.button("⏭"): _shift(+12)
 
     # ---------- calendario ----------
-    m_ini = datetime(y, m, 1)
-    m_end = (m_ini + pd.offsets.MonthEnd()).to_pydatetime()
-    cols = st.columns(7)
-    offset = m_ini.weekday()                           # lunes = 0
-    for _ in range(offset): cols[_].write(" ")
-
-    for i, d in enumerate(pd.date_range(m_ini, m_end)):
-        if i and (offset+i) % 7 == 0:
-            cols = st.columns(7)
-        col = cols[(offset+i) % 7]
-
-        d_str = d.strftime("%Y-%m-%d")
-        rec   = imp_df[imp_df["Fecha"] == d_str]
-        has_i = not rec.empty
-
-        if col.button(str(d.day), key=f"btn_{d_str}"):
-            st.session_state["imp_sel"] = d_str
-
-        if has_i and rec.iloc[0]["ImageURLs"]:
-            thumb = rec.iloc[0]["ImageURLs"].splitlines()[0].strip()
-            try:
-                col.image(thumb, width=50)
-            except st.runtime.media_file_storage.MediaFileStorageError:
-                col.write("🖼️")
-        else:
-            col.write(" ")
+    with step("render:calendar", rows=len(imp_df)):
+        m_ini = datetime(y, m, 1)
+        m_end = (m_ini + pd.offsets.MonthEnd()).to_pydatetime()
+        cols = st.columns(7)
+        offset = m_ini.weekday()                           # lunes = 0
+        for _ in range(offset): cols[_].write(" ")
+
+        for i, d in enumerate(pd.date_range(m_ini, m_end)):
+            if i and (offset+i) % 7 == 0:
+                cols = st.columns(7)
+            col = cols[(offset+i) % 7]
+
+            d_str = d.strftime("%Y-%m-%d")
+            rec   = imp_df[imp_df["Fecha"] == d_str]
+            has_i = not rec.empty
+
+            if col.button(str(d.day), key=f"btn_{d_str}"):
+                st.session_state["imp_sel"] = d_str
+
+            if has_i and rec.iloc[0]["ImageURLs"]:
+                thumb = rec.iloc[0]["ImageURLs"].splitlines()[0].strip()
+                try:
+                    col.image(thumb, width=50)
+                except st.runtime.media_file_storage.MediaFileStorageError:
+                    col.write("🖼️")
+            else:
+                col.write(" ")
 
     # ---------- formulario ----------
     sel = st.session_state.get("imp_sel")
@@ -182,17 +142,20 @@ with st.expander("📅 Daily Impressions", expanded=False):
                    "Reflection": reflect, "Good?": good,
                    "ImageURLs": urls}
 
-        if rec.empty:
+            ws_imp = open_ws(SHEET_KEY, IMP_TAB)
+            if rec.empty:
                 with_retry(ws_imp.append_row,
                            [row[c] for c in IMP_HEADER])
-        else:
+            else:
                 r = rec.index[0] + 2
                 with_retry(ws_imp.update,
                            f"A{r}:E{r}", [[row[c] for c in IMP_HEADER]])
 
-        st.success("Guardado ✔️")
             # deselecciona día para evitar rerun en bucle
-        st.session_state.pop("imp_sel", None)
+            st.session_state.pop("imp_sel", None)
+            flash("Guardado ✔️"); st.rerun()
+
+lazy_panel("📅 Daily Impressions", "impressions", _panel_impressions)
 
 
 
@@ -200,7 +163,7 @@ with st.expander("📅 Daily Impressions", expanded=False):
 # ======================================================
 # 1 · Registrar trade
 # ======================================================
-with st.expander("➕ Registrar trade", expanded=False):
+def _panel_add():
     c1, c2 = st.columns(2)
 
     # ---------- columna 1 ----------
@@ -244,6 +207,13 @@ with st.expander("➕ Registrar trade", expanded=False):
         net_usd = gross - commission
     r_val = calc_r(net_usd)
 
+    # ---------- reglas: aviso antes de guardar ----------
+    trade_dt = pd.Timestamp(f"{fecha} {hora}")
+    eng = (_rules_engine() if not df.empty else
+           RuleEngine(initial_cap, st.session_state.get("rules_cfg", {})))
+    for kind, msg in eng.preview(trade_dt, net_usd):
+        getattr(st, kind)(msg)
+
     # ---------- guardar ----------
     if st.button("Agregar Trade"):
         trade = {
@@ -260,190 +230,160 @@ with st.expander("➕ Registrar trade", expanded=False):
             "IdeaMissedURL": missed_urls,
             "IsIdeaOnly": "No", "BEOutcome": ""
         }
-        ws.append_row([trade[c] for c in HEADER])
-        st.success("✔️ Trade agregado")
-        df = get_all()
+        store.append(trade)
+        broken = [RULE_NAMES[e["rule"]] for e in eng.push(trade_dt, net_usd)]
+        flash("✔️ Trade agregado" + (f" · ⚠️ regla rota: {', '.join(broken)}"
+                                    if broken else ""),
+              "warning" if broken else "success")
+        st.rerun()
+
+lazy_panel("➕ Registrar trade", "add", _panel_add)
+
 # ======================================================
 #  🔄 Importar reporte MT5
 # ======================================================
-import io, time, pandas as pd, numpy as np
-
-# ────── util ──────
-def _find_header_row(df_raw: pd.DataFrame) -> int:
-    """Devuelve el índice de la fila cuyo primer valor sea 'Time'."""
-    for i, cell in enumerate(df_raw.iloc[:, 0].astype(str)):
-        if cell.strip().lower() == "time":
-            return i
-    return 0
-
-# ────── mapeo MT5 → internos ──────
-ALIASES = {
-    "position": "ticket",
-    "time":     "time",
-    "symbol":   "symbol",
-    "type":     "type",
-    "volume":   "volume",
-    "profit":   "profit",
-}
-REQ_COLS = {"ticket", "symbol", "volume", "type", "profit", "time"}
-
 def _proc_report(upload):
-    bin_ = upload.read()
-
-    # 1· leemos bruto para detectar la fila-encabezado real
-    df_raw = pd.read_excel(io.BytesIO(bin_), header=None, engine="openpyxl")
-    hdr_row = _find_header_row(df_raw)
-
-    # 2· volvemos a leer usando esa fila como encabezados
-    df = pd.read_excel(io.BytesIO(bin_), skiprows=hdr_row, engine="openpyxl")
+    # parseado una vez por archivo subido (y versión): los reruns del
+    # fragment (inputs, botones) no vuelven a abrir el XLSX
+    df, missing = cached(ver, f"mt5:{upload.file_id}", read_mt5_report,
+                         upload.getvalue())
 
-    # 3· normalizamos nombres
-    df.columns = [c.strip().lower() for c in df.columns]
-    df = df.rename(columns={c: ALIASES[c] for c in df.columns if c in ALIASES})
-
-    # 4· validamos
-    missing = REQ_COLS.difference(df.columns)
+    # validamos
     if missing:
         st.error(f"❌ Faltan columnas {missing}\n"
                  f"Encabezados detectados: {list(df.columns)}")
-        return
+        return None
 
-    # 5· preview
+    # preview
     st.success("✅ Reporte leído correctamente")
     st.dataframe(df.head())
+    return df
 
-    # ---------- (opcional) subir a Google Sheets ----------
-    # for _, r in df.iterrows():
-    #     trade = {**{c:"" for c in HEADER}, **{
-    #         "Fecha":  str(r["time"].date()),
-    #         "Hora":   str(r["time"].time()),
-    #         "Symbol": r["symbol"],
-    #         "Type":   "Long" if str(r["type"]).lower()=="buy" else "Short",
-    #         "Volume": r["volume"],
-    #         "Ticket": int(r["ticket"]),
-    #         "Win/Loss/BE": "Win" if r["profit"]>0 else "Loss",
-    #         "USD":    r["profit"],
-    #         "Gross_USD": r["profit"],
-    #         "Commission": 0,
-    #         "R":      calc_r(r["profit"]),
-    #     }}
-    #     ws.append_row([trade[c] for c in HEADER])
-    # st.success("📥 Trades importados a la hoja")
-
-with st.expander("⬆️ Importar reporte MT5", expanded=False):
+def _panel_import():
     upl = st.file_uploader("Arrastra el XLSX exportado desde MT5", type=["xlsx"])
     if upl:
         _proc_report(upl)
 
+lazy_panel("⬆️ Importar reporte MT5", "import", _panel_import)
+
 # ======================================================
 # 2 · KPI panel
 # ======================================================
-with st.expander("📊 Métricas / KPIs", expanded=False):
+def _panel_kpis():
     if df.empty:
         st.info("Aún no hay trades.")
     else:
         # ----------- datos reales -----------
-        df_real = df[df["Win/Loss/BE"] != "Adj"].copy()
-        df_real[["USD","Volume"]] = df_real[["USD","Volume"]].apply(
-                                        pd.to_numeric, errors="coerce")
-
-        total   = len(df_real)
-        wins    = (df_real["Win/Loss/BE"]=="Win").sum()
-        losses  = (df_real["Win/Loss/BE"]=="Loss").sum()
-        be_tr   = (df_real["Win/Loss/BE"]=="BE").sum()
-        win_rate= round(100*wins/total,2) if total else 0
-
-        gross_p = df_real[df_real["USD"]>0]["USD"].sum()
-        gross_l = df_real[df_real["USD"]<0]["USD"].sum()
-        net_p   = df_real["USD"].sum()
-        commissions_sum = df_real["Commission"].sum()
-
-        prof_factor = round(abs(gross_p/gross_l),2) if gross_l else 0
-        payoff = (round(df_real[df_real["USD"]>0]["USD"].mean() /
-                        abs(df_real[df_real["USD"]<0]["USD"].mean()),2)
-                  if losses else 0)
-
-        # ----------- equity y objetivos -----------
-        current_eq = initial_cap + net_p
-        pct_change = 100*(current_eq-initial_cap)/initial_cap
-
-        dd_limit   = initial_cap*0.90
-        dist_dd    = current_eq-dd_limit
-        trades_to_burn = math.ceil(abs(dist_dd)/(initial_cap*0.0025))
-
-        f1_target  = initial_cap*1.08
-        f2_target  = initial_cap*1.13
-        dist_f1    = f1_target-current_eq
-        dist_f2    = f2_target-current_eq
-        f1_done    = dist_f1<=0
-
-        risk_amt   = initial_cap*0.0025
-        r_total    = net_p/risk_amt
-        r_f1       = max(dist_f1,0)/risk_amt
-        r_f2       = max(dist_f2,0)/risk_amt
-
-        pct_f1 = 100*max(dist_f1,0)/initial_cap
-        pct_f2 = 100*max(dist_f2,0)/initial_cap
-
-        t13_f1 = max(0,int(np.ceil(r_f1/3)));  t13_f2 = max(0,int(np.ceil(r_f2/3)))
-        t14_f1 = max(0,int(np.ceil(r_f1/4)));  t14_f2 = max(0,int(np.ceil(r_f2/4)))
-        t15_f1 = max(0,int(np.ceil(r_f1/5)));  t15_f2 = max(0,int(np.ceil(r_f2/5)))
+        df_real, m, df_sorted = cached(ver, "kpis", _kpi_data, df)
+        wins, losses, be_tr = m["wins"], m["losses"], m["be"]
 
         fmt = lambda v: f"{v:,.2f}"
 
         # ---------- 1ª fila ----------
         k = st.columns(7)
-        k[0].metric("Total Trades", total)
-        k[1].metric("Win Rate", f"{win_rate:.2f} %")
-        k[2].metric("Profit Factor", fmt(prof_factor))
-        k[3].metric("Payoff ratio", fmt(payoff))
-        k[4].metric("Net Profit", fmt(net_p))
-        k[5].metric("Gross Profit", fmt(gross_p))
-        k[6].metric("Gross Loss", fmt(gross_l))
+        k[0].metric("Total Trades", m["total"])
+        k[1].metric("Win Rate", f"{m['win_rate']:.2f} %")
+        k[2].metric("Profit Factor", fmt(m["profit_factor"]))
+        k[3].metric("Payoff ratio", fmt(m["payoff"]))
+        k[4].metric("Net Profit", fmt(m["net_profit"]))
+        k[5].metric("Gross Profit", fmt(m["gross_profit"]))
+        k[6].metric("Gross Loss", fmt(m["gross_loss"]))
 
         # ---------- 2ª fila ----------
         k = st.columns(7)
-        k[0].metric("Comisiones", fmt(commissions_sum))
-        k[1].metric("Equity", fmt(current_eq), f"{pct_change:.2f} %")
-        k[2].metric("Dist. DD −10 %", fmt(dist_dd), f"{trades_to_burn} trades")
+        k[0].metric("Comisiones", fmt(m["commissions"]))
+        k[1].metric("Equity", fmt(m["equity"]), f"{m['pct_change']:.2f} %")
+        k[2].metric("Dist. DD −10 %", fmt(m["dist_dd"]),
+                    f"{m['trades_to_burn']} trades")
 
         # ----- Loss convertibles (Yes / total Loss) -----
-        conv_yes = ((df_real["Win/Loss/BE"]=="Loss") &
-                    (df_real["SecondTradeValid?"]=="Yes")).sum()
-        conv_tot = losses
-        conv_pct = 100*conv_yes/conv_tot if conv_tot else 0
-        k[3].metric("SecondTradeValid", f"{conv_yes}/{conv_tot}",
-                    f"{conv_pct:.1f} %",
-                    delta_color="normal" if conv_pct>=50 else "inverse")
-
-        k[4].metric("R acumuladas", f"{r_total:.2f}")
+        k[3].metric("SecondTradeValid", f"{m['conv_yes']}/{m['conv_tot']}",
+                    f"{m['conv_pct']:.1f} %",
+                    delta_color="normal" if m["conv_pct"]>=50 else "inverse")
+
+        k[4].metric("R acumuladas", f"{m['r_total']:.2f}")
         k[5].metric("BE count", be_tr)
         k[6].metric("Win / Loss", f"{wins} / {losses}")
 
         # ---------- 3ª fila ----------
         k = st.columns(7)
-        k[0].metric("Fase 1 +8 %", "✅" if f1_done else fmt(dist_f1),
-                    None if f1_done else f"{r_f1:.1f} R | {pct_f1:.2f}%")
-        k[1].metric("Fase 2 +13 %", fmt(dist_f2),
-                    f"{r_f2:.1f} R | {pct_f2:.2f}%")
-        k[2].metric("Trades 1:3 F1", t13_f1)
-        k[3].metric("Trades 1:3 F2", t13_f2)
-        k[4].metric("Trades 1:4/5 F1", f"{t14_f1}/{t15_f1}")
-        k[5].metric("Trades 1:4/5 F2", f"{t14_f2}/{t15_f2}")
+        k[0].metric("Fase 1 +8 %", "✅" if m["f1_done"] else fmt(m["dist_f1"]),
+                    None if m["f1_done"] else
+                    f"{m['r_f1']:.1f} R | {m['pct_f1']:.2f}%")
+        k[1].metric("Fase 2 +13 %", fmt(m["dist_f2"]),
+                    f"{m['r_f2']:.1f} R | {m['pct_f2']:.2f}%")
+        k[2].metric("Trades 1:3 F1", m["t13_f1"])
+        k[3].metric("Trades 1:3 F2", m["t13_f2"])
+        k[4].metric("Trades 1:4/5 F1", f"{m['t14_f1']}/{m['t15_f1']}")
+        k[5].metric("Trades 1:4/5 F2", f"{m['t14_f2']}/{m['t15_f2']}")
         k[6].write(" ")
 
         # ---------- gráficos ----------
-        st.plotly_chart(px.pie(names=["Win","Loss","BE"],
-                               values=[wins,losses,be_tr]), use_container_width=True)
-        df_sorted = df_real.sort_values("Datetime")
-        df_sorted["Equity"] = initial_cap + df_sorted["USD"].cumsum()
-        st.plotly_chart(px.line(df_sorted, x="Datetime", y="Equity",
-                                title="Equity curve"), use_container_width=True)
+        chart(ver, "kpis:pie", lambda: px.pie(names=["Win","Loss","BE"],
+                                              values=[wins,losses,be_tr]),
+              use_container_width=True)
+        chart(ver, "kpis:equity", lambda: px.line(df_sorted, x="Datetime", y="Equity",
+                                                  title="Equity curve"),
+              use_container_width=True)
+
+        # ---------- ventanas móviles (¿se degrada el edge?) ----------
+        st.markdown("#### Edge en ventana móvil")
+        c1, c2, c3 = st.columns(3)
+        by      = c1.radio("Ventana por", ["trades", "days"], horizontal=True,
+                           key="roll_by")
+        windows = sorted(c2.multiselect("Tamaños", [10, 20, 50, 100, 200],
+                                        default=[20, 50], key="roll_w"))
+        metric  = c3.selectbox("Métrica", ROLLING_METRICS, key="roll_metric")
+        roll = cached(ver, f"rolling:{by}:{windows}", rolling_frame,
+                      df_real, windows, by)
+        if roll.empty:
+            st.caption("No hay suficientes trades para esas ventanas.")
+        else:
+            chart(ver, "rolling", lambda: px.line(roll, x="Datetime", y=metric,
+                                                  color="window",
+                                                  title=f"Rolling {metric}"),
+                  params=(by, tuple(windows), metric), use_container_width=True)
+
+lazy_panel("📊 Métricas / KPIs", "kpis", _panel_kpis)
+
+# ======================================================
+#  📏 Reglas prop-firm
+# ======================================================
+def _panel_rules():
+    cfg = {**DEFAULT_RULES, **st.session_state.get("rules_cfg", {})}
+    c = st.columns(5)
+    new = dict(
+        daily_loss_pct=c[0].number_input("Pérdida diaria %", 0.0, 100.0,
+                                         100*cfg["daily_loss_pct"], 0.5) / 100,
+        max_dd_pct=c[1].number_input("DD máximo %", 0.0, 100.0,
+                                     100*cfg["max_dd_pct"], 0.5) / 100,
+        dd_mode=c[2].radio("Modo DD", ["static", "trailing"],
+                           ["static", "trailing"].index(cfg["dd_mode"])),
+        min_days=int(c[3].number_input("Días mínimos", 0, 365,
+                                       cfg["min_days"])),
+        consistency_pct=c[4].number_input("Consistencia % (0 = off)", 0.0, 100.0,
+                                          100*cfg["consistency_pct"], 5.0) / 100,
+    )
+    st.session_state["rules_cfg"] = {k: v for k, v in new.items()
+                                     if v != DEFAULT_RULES[k]}
+    if df.empty:
+        st.info("Aún no hay trades."); return
+
+    eng = _rules_engine()
+    st.dataframe(eng.status(), hide_index=True, use_container_width=True)
+    st.markdown(f"**Historial de quiebres** ({len(eng.breaches)})")
+    if eng.breaches:
+        st.dataframe(pd.DataFrame(eng.breaches), hide_index=True,
+                     use_container_width=True)
+    else:
+        st.caption("Sin quiebres en el historial.")
+
+lazy_panel("📏 Reglas prop-firm", "rules", _panel_rules)
 
 # ======================================================
 # X · ⚠️ Loss sin Resolver
 # ======================================================
-with st.expander("⚠️ Loss sin Resolver", expanded=False):
+def _panel_pending():
     # Filtramos solo Loss sin 'Resolved'
     pend = df[(df["Win/Loss/BE"] == "Loss") & (df["Resolved"] != "Yes")]
     st.metric("Pendientes", len(pend))          # mini-métrica rápida
@@ -451,40 +391,86 @@ with st.expander("⚠️ Loss sin Resolver", expanded=False):
         st.success("Todo resuelto ✅")
     else:
         # mostramos columnas clave
+        shots = fields(store, SHEET_KEY, ["Screenshot"], pend.index)
         st.dataframe(
-            pend[["Fecha", "Hora", "Screenshot", "USD", "ErrorCategory"]],
+            pend.join(shots)
+                [["Fecha", "Hora", "Screenshot", "USD", "ErrorCategory"]],
             height=200
         )
+        # marcar varios como resueltos → un solo batch_update
+        labels = {f"{r['Fecha']} {r['Hora']} · {r['Symbol']} · {r['USD']}": r[ID_COL]
+                  for _, r in pend.iterrows()}
+        to_fix = st.multiselect("Marcar como resueltos", list(labels))
+        if st.button("✅ Marcar Resolved") and to_fix:
+            try:
+                for lab in to_fix:
+                    store.stage(labels[lab], {"Resolved": "Yes"})
+                n = store.commit()
+                flash(f"{n} trade(s) marcados como resueltos.")
+            except ConflictError as e:
+                store.discard()
+                flash(f"La hoja cambió mientras editabas {e.trade_ids}; "
+                      "inténtalo de nuevo.", "error")
+            st.rerun()
+
         # botón para saltar al editor del primer pendiente
         if st.button("Ir al primero en Editar/Borrar"):
             idx_first = int(pend.index[0])
             # Guarda parámetro en la URL para que Edit/Borrar lo lea
-            st.experimental_set_query_params(edit=str(idx_first))
-            st.experimental_rerun()
+            st.query_params["edit"] = str(idx_first)
+            st.rerun()
+
+lazy_panel("⚠️ Loss sin Resolver", "pending", _panel_pending)
 
 # ======================================================
 # 4 · Historial
 # ======================================================
-with st.expander("📜 Historial", expanded=False):
-    st.dataframe(df, use_container_width=True)
+def _panel_history():
+    full = df.join(fields(store, SHEET_KEY, COLD_COLS))
+    st.dataframe(full[[c for c in HEADER + ["Datetime"] if c in full]],
+                 use_container_width=True)
+
+lazy_panel("📜 Historial", "history", _panel_history)
 
 # ======================================================#
 # 5 · Editar / Borrar
 # ======================================================
-with st.expander("✏️ Editar / Borrar", expanded=False):
+def _changes(new:dict, old:dict) -> dict:
+    """Columnas de ``new`` que difieren de lo leído (``old``); lo que el
+    usuario no tocó no se reescribe."""
+    def same(a, b):
+        try:
+            return float(a) == float(b)
+        except (TypeError, ValueError):
+            return str(a) == str(b)
+    return {c: v for c, v in new.items()
+            if c in HEADER and c != ID_COL and not same(v, old.get(c, ""))}
+
+def _panel_edit():
     if df.empty:
         st.info("No hay trades.")
     else:
-        idx = st.number_input("Idx", 0, df.shape[0] - 1, step=1)
+        idx = st.number_input("Idx", 0, df.shape[0] - 1, step=1,
+                              value=min(int(st.query_params.get("edit", 0)),
+                                        df.shape[0] - 1))
         sel = df.loc[idx].to_dict()
+        cold = fields(store, SHEET_KEY, COLD_COLS, [idx])
+        if cold.empty:
+            # la fila se corrió (otra sesión insertó / borró): sin sus
+            # columnas frías el formulario las guardaría en blanco
+            flash("La hoja cambió; se recargó el journal.", "warning")
+            st.rerun()
+        sel.update(cold.iloc[0].to_dict())
         st.json(sel)
 
         # ---------- BORRAR ----------
         if st.button("Borrar"):
-            df = df.drop(idx).reset_index(drop=True)
-            ws.clear(); ws.append_row(HEADER)
-            ws.append_rows(df[HEADER].values.tolist())
-            st.success("Borrado."); df = get_all()
+            try:
+                store.delete(sel[ID_COL])
+                flash("Borrado.")
+            except ConflictError:
+                flash("El trade ya no existe en la hoja.", "error")
+            st.rerun()
 
         # ---------- EDITAR ----------
         with st.form("edit"):
@@ -512,30 +498,93 @@ with st.expander("✏️ Editar / Borrar", expanded=False):
 
             submit = st.form_submit_button("Guardar")
             if submit:
-                # --- recalcular números ---
-                vol   = float(new["Volume"])
-                comm  = true_commission(vol)
-                gross = float(new["Gross_USD"])
-                if new["Win/Loss/BE"] in ("Loss","BE") and gross > 0:
-                    gross = -abs(gross)
-                net = -comm if new["Win/Loss/BE"] == "BE" else gross - comm
-
-                sel.update(new)
-                sel.update({
-                    "Commission": comm,
-                    "Gross_USD": gross if new["Win/Loss/BE"] != "BE" else 0,
-                    "USD": net,
-                    "R": calc_r(net),
-                    "Resolved": "Yes" if res_chk else "No",
-                })
-
-                update_row(idx, sel)
-                st.success("Guardado."); df = get_all()
+                new["Resolved"] = "Yes" if res_chk else "No"
+                chg = _changes(new, sel)
+                # --- recalcular números (solo si cambió algo que los define) ---
+                if chg.keys() & {"Volume", "Gross_USD", "Win/Loss/BE"}:
+                    vol   = float(new["Volume"])
+                    comm  = true_commission(vol)
+                    gross = float(new["Gross_USD"])
+                    if new["Win/Loss/BE"] in ("Loss","BE") and gross > 0:
+                        gross = -abs(gross)
+                    net = -comm if new["Win/Loss/BE"] == "BE" else gross - comm
+                    chg = _changes({
+                        **new,
+                        "Commission": comm,
+                        "Gross_USD": gross if new["Win/Loss/BE"] != "BE" else 0,
+                        "USD": net,
+                        "R": calc_r(net),
+                    }, sel)
+
+                try:
+                    if chg:
+                        store.stage(sel[ID_COL], chg)
+                    store.commit()
+                    flash("Guardado." if chg else "Sin cambios.",
+                          "success" if chg else "info")
+                except ConflictError:
+                    store.discard()
+                    flash("Otro usuario modificó este trade; "
+                          "revisa los cambios antes de guardar.", "error")
+                st.rerun()
+
+lazy_panel("✏️ Editar / Borrar", "edit", _panel_edit)
 
 # ======================================================
 # 3 · Balance Adjustment (fantasma)
 # ======================================================
-with st.expander("🩹 Balance Adjustment", expanded=False):
+def _panel_adjust():
+    # ---------- conciliación por Ticket ----------
+    upl = st.file_uploader("Reporte MT5 (XLSX) para conciliar", type=["xlsx"],
+                           key="recon_upl")
+    if upl:
+        mt5 = _proc_report(upl)
+        if mt5 is not None:
+            rc = cached(ver, f"reconcile:{upl.file_id}", reconcile, mt5, df)
+            k = st.columns(5)
+            k[0].metric("Conciliados", rc["matched"])
+            k[1].metric("Faltan en journal", len(rc["missing"]))
+            k[2].metric("Sin ticket en MT5", len(rc["extra"]))
+            k[3].metric("Con diferencias", len(rc["mismatched"]))
+            k[4].metric("Sin ticket", rc["no_ticket"])
+            if len(rc["duplicated"]):
+                st.warning(f"{len(rc['duplicated'])} trades con ticket repetido "
+                           "en el journal (no se concilian).")
+                st.dataframe(rc["duplicated"], hide_index=True)
+
+            if len(rc["mismatched"]):
+                st.markdown("**Diferencias MT5 − journal**")
+                st.dataframe(rc["mismatched"][
+                    ["Ticket", ID_COL, "Symbol", "Result",
+                     "Volume_mt5", "Volume_jr", "Gross_mt5", "Gross_jr",
+                     "Commission_mt5", "Commission_jr"]], hide_index=True)
+                fixes = propose_corrections(rc["mismatched"])
+                if st.button(f"🛠 Aplicar {len(fixes)} correcciones"):
+                    try:
+                        for tid, chg in fixes:
+                            store.stage(tid, chg)
+                        store.commit()
+                        flash(f"{len(fixes)} trades corregidos con datos de MT5.")
+                    except ConflictError as e:
+                        store.discard()
+                        flash(f"La hoja cambió en {e.trade_ids}; vuelve a conciliar.",
+                              "error")
+                    st.rerun()
+
+            if len(rc["missing"]):
+                st.markdown("**Trades de MT5 que faltan en el journal**")
+                st.dataframe(rc["missing"], hide_index=True)
+                if st.button(f"📥 Importar {len(rc['missing'])} faltantes"):
+                    store.append_many(missing_rows(rc["missing"]))
+                    flash(f"{len(rc['missing'])} trades importados."); st.rerun()
+
+            if len(rc["extra"]):
+                st.markdown("**Tickets del journal que MT5 no reporta**")
+                st.dataframe(rc["extra"], hide_index=True)
+
+    # ---------- ajuste manual (fantasma) ----------
+    st.markdown("---")
+    df_real = cached(ver, "kpis", _kpi_data, df)[0]
     current_net = round(df_real["USD"].sum(),2)
     st.write(f"Net Profit sin ajustes: **{current_net:,.2f} USD**")
     mt5_val = st.number_input("Net Profit según MT5",
@@ -549,5 +598,9 @@ with st.expander("🩹 Balance Adjustment", expanded=False):
             today,now,"ADJ","Adj",0.0,"","Adj", diff,0.0,diff,
             calc_r(diff),"","","Adjustment","","","No","","","",""
         ]))
-        ws.append_row([adj[c] for c in HEADER])
-        st.success("Ajuste añadido; F5 para ver métricas.")
+        store.append(adj)
+        flash("Ajuste añadido."); st.rerun()
+
+lazy_panel("🩹 Balance Adjustment", "adjust", _panel_adjust)
+
+perf_sidebar()
@@ -3,31 +3,36 @@ import streamlit as st, pandas as pd, numpy as np
 import plotly.express as px, plotly.graph_objects as go
 from google.oauth2.service_account import Credentials
 import gspread
+from journal_store import SHEET_KEY, JOURNAL_TAB, HOT_COLS, TradeStore
+from panels import (lazy_panel, cached, start_profiler, chart,
+                    perf_sidebar, load_journal, fields)
+from kpis import (INITIAL_CAP, RISK_PCT, COMMISSION_PER_LOT, executed_trades,
+                  streaks, drawdown, sharpe_sortino, period_summary)
+import whatif
 
 # -------------------------------------------------------------
 # CONFIGURACIÓN
 # -------------------------------------------------------------
 st.set_page_config(page_title="Quantitative Journal – Experimental",
                    layout="wide", initial_sidebar_state="expanded")
+start_profiler("experimental")
 
-creds = Credentials.from_service_account_info(
-            st.secrets["quantitative_journal"],
-            scopes=["https://www.googleapis.com/auth/spreadsheets",
-                    "https://www.googleapis.com/auth/drive"])
-ws = gspread.authorize(creds)\
-        .open_by_key("1D4AlYBD1EClp0gGe0qnxr8NeGMbpSvdOx8yHimQDmbE")\
-        .worksheet("sheet1")
+@st.cache_resource(show_spinner=False)       # una vez por proceso
+def open_ws():
+    creds = Credentials.from_service_account_info(
+                st.secrets["quantitative_journal"],
+                scopes=["https://www.googleapis.com/auth/spreadsheets",
+                        "https://www.googleapis.com/auth/drive"])
+    return gspread.authorize(creds)\
+            .open_by_key(SHEET_KEY)\
+            .worksheet(JOURNAL_TAB)
 
-def get_all():
-    df = pd.DataFrame(ws.get_all_records())
-    if not df.empty:
-        df["Datetime"] = pd.to_datetime(df["Fecha"]+" "+df["Hora"], errors="coerce")
-    return df
-
-def drawdown(eq): return eq.cummax() - eq
+store = TradeStore(open_ws())
 
 # -------------------------------------------------------------
-df = get_all()
+# solo lectura; en memoria las columnas calientes, las URLs las pide cada panel
+df = load_journal(store, SHEET_KEY, backfill=False, columns=HOT_COLS)[JOURNAL_TAB]
+ver = store.version
 st.title("Quantitative Journal – Experimental Features")
 
 if df.empty:
@@ -35,44 +40,70 @@ if df.empty:
     st.stop()
 
 # ------- filtros -------
-df_real = df[df["IsIdeaOnly"] != "Yes"].copy()
-df_real[["USD","Volume"]] = df_real[["USD","Volume"]].apply(
-                                pd.to_numeric, errors="coerce")
-df = df.sort_values("Datetime").reset_index(drop=True)
-initial_cap = 60000
-df_real = df_real.sort_values("Datetime")
+df_real = executed_trades(df)
+df = df.sort_values("Datetime")         # el índice sigue siendo la fila de la hoja
+initial_cap = INITIAL_CAP
 df_real["CumulUSD"] = initial_cap + df_real["USD"].cumsum()
 
+def with_cols(*cols):
+    """``df`` + las columnas frías que declara un panel."""
+    return df.join(fields(store, SHEET_KEY, list(cols)))
+
+# ---------- cálculos por sección (cacheados por versión) ----------
+def _perf_stats(df_real):
+    res, stv = df_real["Win/Loss/BE"], df_real.get("SecondTradeValid?")
+    dd = drawdown(df_real["CumulUSD"])
+    loss_yes = (res=="Loss") & (stv=="Yes")
+    return dict(
+        streaks=streaks(res), dd=dd,
+        sharpe_sortino=sharpe_sortino(df_real, initial_cap),
+        be_saved =int(((res=="BE") & (df_real["BEOutcome"]=="SavedCapital")).sum()),
+        be_missed=int(((res=="BE") & (df_real["BEOutcome"]=="MissedOpportunity")).sum()),
+        conv_yes=int(loss_yes.sum()),
+        conv_no =int(((res=="Loss") & (stv=="No")).sum()),
+        conv_list=df_real.reset_index(names="Idx")[loss_yes.values]
+                         [["Idx","Fecha","Symbol"]],
+    )
+
+def _lots(df, fmt, tag):
+    return (df.groupby(df["Datetime"].dt.strftime(fmt).rename(tag))
+              ["Volume"].sum().reset_index())
+
+def _daily(df_real):
+    return (df_real.groupby(df_real["Datetime"].dt.date)
+                   .agg(Trades=("USD","count"),NetPNL=("USD","sum")).reset_index()
+                   .rename(columns={"Datetime":"DateOnly"}))
+
+def _by_symbol_hour(df_real):
+    hour = pd.to_datetime(df_real["Hora"],format="%H:%M:%S",
+                          errors="coerce").dt.hour.rename("Hour")
+    return (df_real.groupby("Symbol")["USD"].sum().reset_index(),
+            df_real.groupby(hour)["USD"].sum().reset_index())
+
+def _loss_by_cat(df_real):
+    return (df_real[df_real["USD"]<0]
+            .groupby("ErrorCategory")["USD"].sum().reset_index()
+            .rename(columns={"USD":"LossSum"}))
+
 # ===============================================================
 # 1) Métricas de rendimiento avanzado
 # ===============================================================
-with st.expander("1) Métricas de rendimiento avanzado", expanded=False):
+def _panel_perf():
 
-    # Asegura columnas necesarias -------------------------------
-    if "SecondTradeValid?" not in df_real.columns:
-        df_real["SecondTradeValid?"] = "N/A"
-    if "Idx" not in df_real.columns:
-        df_real = df_real.reset_index(names="Idx")
+    p = cached(ver, "exp_perf", _perf_stats, df_real)
 
     # -- Consecutive wins / losses ----------
-    cw = cl = mxw = mxl = 0
-    for res in df_real["Win/Loss/BE"]:
-        if res == "Win":
-            cw += 1; mxw = max(mxw, cw); cl = 0
-        elif res == "Loss":
-            cl += 1; mxl = max(mxl, cl); cw = 0
-        else:
-            cw = cl = 0
+    mxw, mxl = p["streaks"]
     c1, c2 = st.columns(2)
     c1.metric("Max Wins consecutivos", mxw)
     c2.metric("Max Losses consecutivos", mxl)
 
     # -- Drawdown ----------
-    dd = (df_real["CumulUSD"].cummax() - df_real["CumulUSD"])
+    dd = p["dd"]
     max_dd = dd.max()
     st.write(f"**Máx Drawdown:** {round(max_dd,2)} USD "
              f"({round(100*max_dd/initial_cap,2)} %)")
-    st.plotly_chart(
+    chart(ver, "exp_dd", lambda:
         go.Figure(go.Scatter(x=df_real["Datetime"], y=dd,
                              mode="lines", line=dict(color="red")))
         .update_layout(title="Drawdown over time"),
@@ -80,35 +111,26 @@ with st.expander("1) Métricas de rendimiento avanzado", expanded=False):
     )
 
     # -- Sharpe / Sortino (aprox diarios) ----------
-    daily_ret = df_real.groupby(df_real["Datetime"].dt.date)["USD"].sum() / initial_cap
-    sharpe  = daily_ret.mean() / daily_ret.std(ddof=1) if daily_ret.std(ddof=1) else 0
-    downside = daily_ret[daily_ret<0].std(ddof=1)
-    sortino = daily_ret.mean() / downside if downside else 0
+    sharpe, sortino = p["sharpe_sortino"]
     st.write(f"**Sharpe (aprox):** {round(sharpe,2)}  |  "
              f"**Sortino (aprox):** {round(sortino,2)}")
 
     # -- Break-Even Outcome ----------
-    be_saved  = ((df_real["Win/Loss/BE"]=="BE") &
-                 (df_real["BEOutcome"]=="SavedCapital")).sum()
-    be_missed = ((df_real["Win/Loss/BE"]=="BE") &
-                 (df_real["BEOutcome"]=="MissedOpportunity")).sum()
+    be_saved, be_missed = p["be_saved"], p["be_missed"]
     st.write("#### Break-Even Outcomes")
-    st.plotly_chart(
+    chart(ver, "exp_be", lambda:
         px.bar(pd.DataFrame({"Outcome":["Saved","Missed"],
                              "Count":[be_saved,be_missed]}),
                x="Outcome",y="Count",text="Count",title="BE Outcome"),
         use_container_width=True)
 
     # -- Loss convertibles ----------
-    conv_yes = ((df_real["Win/Loss/BE"]=="Loss") &
-                (df_real["SecondTradeValid?"]=="Yes")).sum()
-    conv_no  = ((df_real["Win/Loss/BE"]=="Loss") &
-                (df_real["SecondTradeValid?"]=="No")).sum()
+    conv_yes, conv_no = p["conv_yes"], p["conv_no"]
     conv_pct = 100*conv_yes/(conv_yes+conv_no) if (conv_yes+conv_no) else 0
     st.write(f"### Loss convertibles: {conv_yes}/{conv_yes+conv_no}  "
              f"→ **{conv_pct:.1f}%**")
 
-    st.plotly_chart(
+    chart(ver, "exp_conv", lambda:
         px.bar(pd.DataFrame({"Status":["Convertible","No"],
                              "Count":[conv_yes,conv_no]}),
                x="Status",y="Count",text="Count",
@@ -118,87 +140,89 @@ with st.expander("1) Métricas de rendimiento avanzado", expanded=False):
     # -------- Detalle de índices --------
     with st.container():
         st.markdown("**Índices de Loss convertibles (Yes):**")
-        conv_list = df_real[(df_real["Win/Loss/BE"]=="Loss") &
-                            (df_real["SecondTradeValid?"]=="Yes")][["Idx","Fecha","Symbol"]]
-        st.dataframe(conv_list, height=200)
+        st.dataframe(p["conv_list"], height=200)
+
+lazy_panel("1) Métricas de rendimiento avanzado", "perf", _panel_perf)
 
 # ============================================================
 # 2) Resúmenes semanales / mensuales (trades reales)
 # ============================================================
-with st.expander("2) Resúmenes semanales / mensuales", expanded=False):
-    df_real["WeekTag"]  = df_real["Datetime"].dt.isocalendar().year.astype(str)+\
-                          "-W"+df_real["Datetime"].dt.isocalendar().week.astype(str)
-    weekly = df_real.groupby("WeekTag").agg(Trades=("USD","count"),
-                                            NetPNL=("USD","sum")).reset_index()
-    st.dataframe(weekly); st.plotly_chart(px.bar(weekly,x="WeekTag",y="NetPNL",
-                    title="PNL semanal"), use_container_width=True)
-
-    df_real["MonthTag"] = df_real["Datetime"].dt.strftime("%Y-%m")
-    monthly = df_real.groupby("MonthTag").agg(Trades=("USD","count"),
-                                              NetPNL=("USD","sum")).reset_index()
-    st.dataframe(monthly); st.plotly_chart(px.bar(monthly,x="MonthTag",y="NetPNL",
-                    title="PNL mensual"), use_container_width=True)
-    # ---------- Lotes operados ----------
-with st.expander("🚚 Lotes operados", expanded=False):
-    df["WeekTag"]  = df["Datetime"].dt.strftime("%Y-W%U")
-    df["MonthTag"] = df["Datetime"].dt.strftime("%Y-%m")
-    weekly  = df.groupby("WeekTag")["Volume"].sum().reset_index()
-    monthly = df.groupby("MonthTag")["Volume"].sum().reset_index()
+def _panel_summaries():
+    weekly = cached(ver, "exp_weekly", period_summary, df_real, "W")
+    st.dataframe(weekly); chart(ver, "exp_weekly", lambda: px.bar(
+        weekly,x="WeekTag",y="NetPNL",title="PNL semanal"), use_container_width=True)
+
+    monthly = cached(ver, "exp_monthly", period_summary, df_real, "M")
+    st.dataframe(monthly); chart(ver, "exp_monthly", lambda: px.bar(
+        monthly,x="MonthTag",y="NetPNL",title="PNL mensual"), use_container_width=True)
+
+lazy_panel("2) Resúmenes semanales / mensuales", "summaries", _panel_summaries)
+
+# ---------- Lotes operados ----------
+def _panel_lots():
+    weekly  = cached(ver, "exp_lots_W", _lots, df, "%Y-W%U", "WeekTag")
+    monthly = cached(ver, "exp_lots_M", _lots, df, "%Y-%m", "MonthTag")
     st.write("### Semana")
     st.bar_chart(weekly, x="WeekTag", y="Volume")
     st.write("### Mes")
     st.bar_chart(monthly, x="MonthTag", y="Volume")
 
+lazy_panel("🚚 Lotes operados", "lots", _panel_lots)
+
 # ---------- Loss / BE sin Review ----------
-with st.expander("⚠️ Loss / BE sin Review", expanded=False):
+def _panel_review():
+    df = with_cols("LossTradeReviewURL")
     pend = df[(df["Win/Loss/BE"].isin(["Loss","BE"])) &
               (df["LossTradeReviewURL"]=="")]
     st.write(f"Pendientes: **{len(pend)}**")
     st.dataframe(pend[["Fecha","Hora","Symbol","USD","ErrorCategory"]])
 
+lazy_panel("⚠️ Loss / BE sin Review", "review", _panel_review)
+
 
 # ============================================================
 # 3) Calendario / timeline (trades reales)
 # ============================================================
-with st.expander("3) Calendario / Timeline", expanded=False):
-    daily = df_real.groupby(df_real["Datetime"].dt.date)\
-                   .agg(Trades=("USD","count"),NetPNL=("USD","sum")).reset_index()\
-                   .rename(columns={"Datetime":"DateOnly"})
-    st.plotly_chart(px.bar(daily,x="DateOnly",y="Trades",title="# Trades por día"),
-                    use_container_width=True)
-    st.plotly_chart(px.bar(daily,x="DateOnly",y="NetPNL",title="PNL diario"),
-                    use_container_width=True)
+def _panel_calendar():
+    daily = cached(ver, "exp_daily", _daily, df_real)
+    chart(ver, "exp_daily_trades", lambda: px.bar(
+        daily,x="DateOnly",y="Trades",title="# Trades por día"), use_container_width=True)
+    chart(ver, "exp_daily_pnl", lambda: px.bar(
+        daily,x="DateOnly",y="NetPNL",title="PNL diario"), use_container_width=True)
+
+lazy_panel("3) Calendario / Timeline", "calendar", _panel_calendar)
 
 # ============================================================
 # 4) Análisis por Symbol / Hora (trades reales)
 # ============================================================
-with st.expander("4) Análisis por Symbol / Hora", expanded=False):
-    st.plotly_chart(px.bar(df_real.groupby("Symbol")["USD"].sum().reset_index(),
-                           x="Symbol",y="USD",title="PNL por símbolo",
-                           color="Symbol"), use_container_width=True)
-    df_real["Hour"] = pd.to_datetime(df_real["Hora"],format="%H:%M:%S",
-                                     errors="coerce").dt.hour
-    st.plotly_chart(px.bar(df_real.groupby("Hour")["USD"].sum().reset_index(),
-                           x="Hour",y="USD",title="PNL por hora"),
-                    use_container_width=True)
+def _panel_symbol_hour():
+    by_sym, by_hour = cached(ver, "exp_symbol_hour", _by_symbol_hour, df_real)
+    chart(ver, "exp_symbol", lambda: px.bar(
+        by_sym, x="Symbol",y="USD",title="PNL por símbolo",color="Symbol"),
+        use_container_width=True)
+    chart(ver, "exp_hour", lambda: px.bar(
+        by_hour, x="Hour",y="USD",title="PNL por hora"), use_container_width=True)
+
+lazy_panel("4) Análisis por Symbol / Hora", "symbol_hour", _panel_symbol_hour)
 
 # ============================================================
 # 5) Post‑Analysis · Categorías de error (trades reales)
 # ============================================================
-with st.expander("5) Post‑Analysis · Categorías de error", expanded=False):
+def _panel_errors():
     if "ErrorCategory" in df_real:
-        loss_cat = df_real[df_real["USD"]<0]\
-                   .groupby("ErrorCategory")["USD"].sum().reset_index()\
-                   .rename(columns={"USD":"LossSum"})
+        loss_cat = cached(ver, "exp_loss_cat", _loss_by_cat, df_real)
         st.dataframe(loss_cat)
-        st.plotly_chart(px.bar(loss_cat,x="ErrorCategory",y="LossSum",
-                               title="Pérdidas por categoría",
-                               color="ErrorCategory"), use_container_width=True)
+        chart(ver, "exp_loss_cat", lambda: px.bar(
+            loss_cat,x="ErrorCategory",y="LossSum",title="Pérdidas por categoría",
+            color="ErrorCategory"), use_container_width=True)
+
+lazy_panel("5) Post‑Analysis · Categorías de error", "errors", _panel_errors)
 
 # ===============================================================
 # 6) Loss Trade Reviews – galería agrupada
 # ===============================================================
-with st.expander("Loss Trade Reviews (galería)", expanded=False):
+def _panel_gallery():
+    df = with_cols("LossTradeReviewURL")
     if "LossTradeReviewURL" not in df.columns:
         st.warning("No existe la columna LossTradeReviewURL.")
     else:
@@ -233,10 +257,13 @@ with st.expander("Loss Trade Reviews (galería)", expanded=False):
 
                 st.write("---")
 
+lazy_panel("Loss Trade Reviews (galería)", "gallery", _panel_gallery)
+
 # ============================================================
 # 7) Miedito Trades (ideas no ejecutadas)
 # ============================================================
-with st.expander("7) Miedito Trades", expanded=False):
+def _panel_miedito():
+    df = with_cols("IdeaMissedURL")
     mid = df[df["IsIdeaOnly"]=="Yes"].copy()
     if mid.empty:
         st.info("No hay ideas no ejecutadas.")
@@ -254,10 +281,13 @@ with st.expander("7) Miedito Trades", expanded=False):
                                 unsafe_allow_html=True)
             st.write("---")
 
+lazy_panel("7) Miedito Trades", "miedito", _panel_miedito)
+
 # ============================================================
 # 8) EOD (Study Cases Canva)
 # ============================================================
-with st.expander("8) EOD (Study Cases Canva)", expanded=False):
+def _panel_eod():
+    df = with_cols("EOD")
     eod = df[df["EOD"].str.strip()!=""]
     if eod.empty:
         st.info("No hay EOD.")
@@ -272,4 +302,44 @@ with st.expander("8) EOD (Study Cases Canva)", expanded=False):
                     st.markdown(f"[Abrir EOD Canva]({tr['EOD']})")
                     st.write("---")
 
+lazy_panel("8) EOD (Study Cases Canva)", "eod", _panel_eod)
+
+# ============================================================
+# 9) What-if: riesgo / comisiones / capital
+# ============================================================
+def _panel_whatif():
+    c1, c2 = st.columns(2)
+    risks = c1.text_input("Riesgo % por trade", f"{100*RISK_PCT:g}, 0.5, 1",
+                          key="wi_risk")
+    caps  = c2.text_input("Capital inicial", f"{INITIAL_CAP}, 100000",
+                          key="wi_cap")
+    st.caption("Tablas de comisión (USD/lote); Symbol `*` = resto de símbolos.")
+    tab = st.data_editor(
+        pd.DataFrame({"Modelo": [f"{COMMISSION_PER_LOT:g} USD/lote", "Broker B"],
+                      "Symbol": ["*", "*"],
+                      "USD/lote": [COMMISSION_PER_LOT, 5.0]}),
+        num_rows="dynamic", hide_index=True, key="wi_tables")
+    use_journal = st.checkbox("Incluir comisión registrada", True, key="wi_journal")
+    try:
+        risks = whatif.parse_list(risks, 0.01)
+        caps  = whatif.parse_list(caps)
+    except ValueError:
+        st.error("Riesgo y capital: números separados por comas."); return
+    tables = ({whatif.JOURNAL: None} if use_journal else {}) | \
+             whatif.tables_from_frame(tab)
+    if not (risks and caps and tables):
+        st.info("Define al menos un riesgo, un capital y una tabla."); return
+
+    out = cached(ver, f"whatif:{caps}:{risks}:{sorted(tables.items(), key=str)}",
+                 whatif.replay, df_real, caps, risks, tables)
+    st.caption(f"{len(out)} escenarios · base: {INITIAL_CAP:,} USD al "
+               f"{100*RISK_PCT:g} %")
+    st.dataframe(out.sort_values("Equity", ascending=False),
+                 hide_index=True, use_container_width=True,
+                 column_config={c: st.column_config.DateColumn(c) for c in
+                                out.columns if c.startswith("Fecha")})
+
+lazy_panel("9) What-if: riesgo / comisiones / capital", "whatif", _panel_whatif)
+
 st.write("---\n*Fin del modo experimental.*")
+perf_sidebar()
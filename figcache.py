@@ -0,0 +1,71 @@
+# ------------------  figcache.py  ------------------
+"""Caché de figuras plotly ya serializadas, con presupuesto de bytes (LRU).
+
+Clave: (versión de datos, sección, parámetros de filtro); valor: el JSON que
+se manda al navegador. En un hit no se construye ni se valida la figura:
+``as_figure`` envuelve el JSON guardado en algo que ``st.plotly_chart``
+acepta como figura (re-validar un dict cuesta casi lo mismo que armarla).
+"""
+import json, threading
+from collections import OrderedDict
+import plotly.graph_objects as go
+import plotly.io as pio
+
+BUDGET_BYTES = 64_000_000        # por proceso, compartido entre sesiones
+
+
+class _SpecFigure(go.Figure):
+    """Figura ya serializada: ``to_dict`` decodifica el JSON sin validar.
+
+    No pasa por ``go.Figure.__init__`` (eso es justo la validación que se
+    evita): solo sirve para ``st.plotly_chart``, que en Streamlit ≥ 1.66
+    la serializa con ``to_dict()``. ``test_figcache.py`` lo verifica.
+    """
+
+    def __init__(self, spec:str):
+        object.__setattr__(self, "_spec", spec)
+
+    def to_dict(self):
+        return json.loads(self._spec)
+
+def as_figure(spec:str) -> go.Figure:
+    return _SpecFigure(spec)
+
+
+class FigureCache:
+    """LRU (clave → JSON) que expulsa lo menos usado al pasar ``budget``."""
+
+    def __init__(self, budget:int=BUDGET_BYTES):
+        self.budget, self.bytes = budget, 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key, build):
+        """(JSON, hit?) de la figura; ``build()`` solo corre en un miss."""
+        with self._lock:
+            spec = self._items.get(key)
+            if spec is not None:
+                self._items.move_to_end(key)
+                self.stats["hits"] += 1
+                return spec, True
+        spec = pio.to_json(build(), validate=False)
+        with self._lock:
+            self.stats["misses"] += 1
+            if key not in self._items and len(spec) <= self.budget:
+                self._items[key] = spec
+                self.bytes += len(spec)
+                while self.bytes > self.budget:
+                    _, old = self._items.popitem(last=False)
+                    self.bytes -= len(old)
+                    self.stats["evictions"] += 1
+        return spec, False
+
+    def hit_rate(self) -> float:
+        n = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / n if n else 0.0
+
+    def summary(self) -> dict:
+        return {**self.stats, "hit_rate": round(self.hit_rate(), 3),
+                "entries": len(self._items), "bytes": self.bytes,
+                "budget": self.budget}
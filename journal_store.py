@@ -0,0 +1,380 @@
+# ------------------  journal_store.py  ------------------
+"""Acceso a la hoja de trades: IDs estables, mapa ID → fila y escrituras
+en lote con control optimista de versión."""
+import time, random, re, uuid, hashlib
+import pandas as pd
+import gspread
+from gspread.exceptions import APIError
+
+SHEET_KEY = "1D4AlYBD1EClp0gGe0qnxr8NeGMbpSvdOx8yHimQDmbE"
+
+HEADER = [
+    "Fecha","Hora","Symbol","Type","Volume","Ticket","Win/Loss/BE",
+    "Gross_USD","Commission","USD","R","Screenshot","Comentarios",
+    "Post-Analysis","EOD","ErrorCategory","Resolved","SecondTradeValid?",
+    "LossTradeReviewURL","IdeaMissedURL","IsIdeaOnly","BEOutcome",
+    "TradeID"
+]
+ID_COL = "TradeID"
+
+# columnas frías: texto libre y URLs, largas y solo para mirar un trade.
+# KPIs, equity y resúmenes viven de las calientes; las frías se piden por
+# fila (o por columna, si un panel las declara) con ``fields``.
+COLD_COLS = ["Screenshot", "Comentarios", "Post-Analysis", "EOD",
+             "LossTradeReviewURL", "IdeaMissedURL"]
+HOT_COLS  = [c for c in HEADER if c not in COLD_COLS]
+
+JOURNAL_TAB = "sheet1"
+IMP_TAB     = "daily_impressions"
+IMP_HEADER  = ["Fecha", "Impression", "Reflection", "Good?", "ImageURLs"]
+
+# registro de pestañas (nombre → cabecera): todas salen en el mismo request,
+# una pestaña nueva es solo una entrada más aquí
+TABS = {JOURNAL_TAB: HEADER, IMP_TAB: IMP_HEADER}
+
+
+def _transient(e: APIError) -> bool:
+    """Cuota (429), error del servidor o respuesta ilegible: se reintenta.
+    El resto de 4xx no cambia por insistir."""
+    return e.code in (-1, 429) or e.code >= 500
+
+def with_retry(fn, *args, **kwargs):
+    """Ejecuta fn con reintento exponencial (máx 3) ante errores transitorios."""
+    for attempt in range(3):
+        try:
+            return fn(*args, **kwargs)
+        except APIError as e:
+            if attempt == 2 or not _transient(e):
+                raise
+            wait = 1.5 * (2 ** attempt) + random.uniform(0, 0.5)
+            time.sleep(wait)
+
+def col_letter(n:int) -> str:
+    s=""
+    while n:
+        n, r = divmod(n-1, 26)
+        s = chr(65+r)+s
+    return s
+
+def new_trade_id() -> str:
+    # prefijo "T" para que gspread no lo numericise nunca
+    return "T" + uuid.uuid4().hex[:11]
+
+def row_version(vals) -> str:
+    """Hash corto de la fila tal como viene de la hoja (strings)."""
+    return hashlib.blake2b("\x1f".join(map(str, vals)).encode(),
+                           digest_size=8).hexdigest()
+
+def _cell(v):
+    """Valor serializable para la API (numpy → python, NaN → "")."""
+    if hasattr(v, "item"):
+        v = v.item()
+    return "" if isinstance(v, float) and v != v else v
+
+def _pad(row, n=len(HEADER)):
+    return (list(row) + [""]*n)[:n]
+
+def _frame(cols, header=HEADER) -> pd.DataFrame:
+    """DataFrame tipado (como ``numericise_all``) a partir de las columnas crudas.
+
+    Se numericiza por valor distinto de cada columna: Symbol, Type, fechas,
+    Yes/No… se repiten mucho y la conversión celda a celda domina la carga.
+    """
+    data = {}
+    for h, col in zip(header, cols):
+        memo = {v: gspread.utils.numericise(v) for v in set(col)}
+        data[h] = [memo[v] for v in col]
+    df = pd.DataFrame(data, columns=header)
+    if not df.empty and {"Fecha", "Hora"} <= set(header):
+        df["Datetime"] = pd.to_datetime(df["Fecha"].astype(str)+" "+
+                                        df["Hora"].astype(str),
+                                        errors="coerce")
+    return df
+
+def tab_frame(rows, header, columns=None) -> pd.DataFrame:
+    """DataFrame tipado de una pestaña a partir de sus filas crudas; con
+    ``columns`` solo se tipan (y guardan) esas columnas."""
+    cols = list(zip(*rows)) if rows else [[]]*len(header)
+    if columns is None:
+        return _frame(cols, header)
+    return _frame([cols[header.index(c)] for c in columns], columns)
+
+def project(columns) -> list:
+    """Columnas pedidas en orden de ``HEADER``, siempre con ``ID_COL``."""
+    want = set(columns or HEADER) | {ID_COL}
+    return [c for c in HEADER if c in want]
+
+
+# ---------- pestañas ----------
+def ensure_tabs(sh, tabs=TABS):
+    """Crea las pestañas del registro que falten (solo apps que escriben)."""
+    have = {w.title for w in with_retry(sh.worksheets)}
+    for tab, hdr in tabs.items():
+        if tab not in have:
+            w = with_retry(sh.add_worksheet, tab, rows=1000, cols=max(len(hdr), 10))
+            with_retry(w.update, "A1", [hdr])
+
+def fetch_tabs(sh, tabs=TABS, fix_headers:bool=False) -> dict:
+    """Todas las pestañas del registro en un solo ``values_batch_get``.
+
+    Devuelve ``{pestaña: filas de datos}`` (sin cabecera, rellenadas al ancho
+    de la cabecera). Una pestaña inexistente vuelve vacía; con
+    ``fix_headers`` se reescribe la cabecera que no coincida.
+    """
+    names = list(tabs)
+    rng = lambda t: f"'{t}'!A1:{col_letter(len(tabs[t]))}"
+    try:
+        resp = with_retry(sh.values_batch_get, [rng(t) for t in names])
+    except APIError as e:
+        # un rango de una pestaña que no existe tumba todo el batch (400
+        # "Unable to parse range"); cualquier otro error sube tal cual
+        if e.code != 400 or "parse range" not in str(e.error.get("message")):
+            raise
+        have = {w.title for w in with_retry(sh.worksheets)}
+        names = [t for t in names if t in have]
+        resp = (with_retry(sh.values_batch_get, [rng(t) for t in names])
+                if names else {})
+    got = dict(zip(names, resp.get("valueRanges", [])))
+
+    out = {}
+    for tab, hdr in tabs.items():
+        vals = got.get(tab, {}).get("values", [])
+        if fix_headers and tab in got and (not vals or _pad(vals[0], len(hdr)) != hdr):
+            with_retry(sh.worksheet(tab).update, "A1", [hdr])
+        out[tab] = [_pad(r, len(hdr)) for r in vals[1:]]
+    return out
+
+def _runs(idxs):
+    """[0,1,2,7,8] → [(0,2),(7,8)]: columnas contiguas en un solo rango."""
+    out = []
+    for i in sorted(idxs):
+        if out and i == out[-1][1] + 1:
+            out[-1][1] = i
+        else:
+            out.append([i, i])
+    return [tuple(r) for r in out]
+
+
+class ConflictError(Exception):
+    """Alguna fila cambió (o desapareció) en la hoja desde la última lectura."""
+    def __init__(self, trade_ids):
+        self.trade_ids = list(trade_ids)
+        super().__init__(f"Conflicto de versión en {self.trade_ids}")
+
+
+class TradeStore:
+    """Hoja de trades con mapa TradeID → (fila, versión) en memoria.
+
+    Las ediciones se acumulan con ``stage`` y salen juntas en un único
+    ``batch_update`` al llamar ``commit``.
+    """
+
+    def __init__(self, ws):
+        self.ws = ws
+        self._rows = {}       # TradeID -> nº de fila en la hoja (1-based)
+        self._ver  = {}       # TradeID -> versión leída
+        self._pending = {}    # TradeID -> {col: valor}
+        self.version  = ""    # hash del contenido completo de la última lectura
+        self.raw      = []    # filas crudas de la última lectura de la hoja
+        self.size     = 0     # nº de filas de datos de la última lectura
+
+    # ---------- lectura ----------
+    def ensure_header(self):
+        if with_retry(self.ws.row_values, 1) != HEADER:
+            with_retry(self.ws.update, "A1", [HEADER])
+
+    def load(self, backfill:bool=True, rows=None, columns=None) -> pd.DataFrame:
+        """Lee la hoja, asigna IDs a filas sin ID y reconstruye el mapa.
+
+        Con ``backfill=False`` no escribe nada (lectores headless); las filas
+        sin ID quedan fuera del mapa. ``rows``: filas ya leídas (p.ej. de
+        ``fetch_tabs``) para no volver a pedirlas. ``columns``: proyección
+        del DataFrame (el mapa y las versiones siempre usan la fila entera).
+        """
+        if rows is None:
+            rows = with_retry(self.ws.get_all_values)[1:]
+        return self._index([_pad(r) for r in rows], backfill, columns)
+
+    def _index(self, rows, backfill:bool=True, columns=None) -> pd.DataFrame:
+        id_i = HEADER.index(ID_COL)
+        self._rows, self._ver, self._pending = {}, {}, {}
+
+        if backfill and any(not r[id_i] for r in rows):
+            self._backfill(rows)
+        for pos, r in enumerate(rows):
+            if r[id_i]:
+                self._rows[r[id_i]] = pos + 2
+                self._ver[r[id_i]]  = row_version(r)
+        self.version = row_version(row_version(r) for r in rows)
+        self.raw, self.size = rows, len(rows)
+        return tab_frame(rows, HEADER, columns and project(columns))
+
+    def _backfill(self, rows):
+        """Asigna IDs a las filas sin ID de ``rows`` y los escribe.
+
+        Antes de escribir se relee la hoja: una celda vacía de la columna de
+        IDs no dice qué fila es, así que solo se escribe donde la fila entera
+        sigue igual que en ``rows`` (si otra sesión insertó o borró filas
+        desde la lectura, las corridas quedan sin ID hasta la próxima carga).
+        """
+        id_i = HEADER.index(ID_COL)
+        cur  = [_pad(r) for r in with_retry(self.ws.get_all_values)[1:]]
+        new_ids = []
+        for pos, r in enumerate(rows):
+            if not r[id_i] and pos < len(cur) and cur[pos] == r:
+                r[id_i] = new_trade_id()
+                new_ids.append({"range": f"{col_letter(id_i+1)}{pos+2}",
+                                "values": [[r[id_i]]]})
+        if new_ids:
+            with_retry(self.ws.batch_update, new_ids)
+
+    def restore(self, cols, vers, version:str, columns=HEADER) -> pd.DataFrame:
+        """Mapa + DataFrame desde un snapshot (columnas crudas ``columns`` y
+        versión por fila) sin leer la hoja. Las escrituras siguen verificando
+        contra la hoja."""
+        self._rows, self._ver, self._pending = {}, {}, {}
+        for pos, (tid, v) in enumerate(zip(cols[columns.index(ID_COL)], vers)):
+            if tid:
+                self._rows[tid] = pos + 2
+                self._ver[tid]  = v
+        self.version, self.raw, self.size = version, [], len(vers)
+        return _frame(cols, columns)
+
+    def sheet_row(self, trade_id:str) -> int:
+        return self._rows[trade_id]
+
+    def fields(self, columns, pos=None) -> pd.DataFrame:
+        """Columnas ``columns`` leídas de la hoja en un solo ``batch_get`` por
+        rangos de columnas contiguas: de las filas en las posiciones ``pos``
+        (0 = primera fila de datos, como el índice del DataFrame cargado) o,
+        sin ``pos``, la columna entera. Índice: la posición, así también
+        sirve para filas sin ``TradeID``."""
+        cols = project(columns)
+        runs = _runs(HEADER.index(c) for c in cols)
+        rng  = lambda a, b, r0, r1="": f"{col_letter(a+1)}{r0}:{col_letter(b+1)}{r1}"
+        if pos is None:
+            got  = with_retry(self.ws.batch_get, [rng(a, b, 2) for a, b in runs])
+            # la API recorta las filas vacías del final
+            pos  = range(max([self.size] + [len(vr) for vr in got]))
+            rows = [sum((_pad(vr[i] if i < len(vr) else [], b-a+1)
+                         for (a, b), vr in zip(runs, got)), []) for i in pos]
+        else:
+            pos  = [int(p) for p in pos]
+            got  = with_retry(self.ws.batch_get,
+                              [rng(a, b, p+2, p+2) for p in pos for a, b in runs])
+            k    = len(runs)
+            rows = [sum((_pad(vr[0] if vr else [], b-a+1)
+                         for (a, b), vr in zip(runs, got[i*k:(i+1)*k])), [])
+                    for i in range(len(pos))]
+        df = tab_frame(rows, cols).set_axis(list(pos))
+        # filas corridas desde la última lectura: el ID ya no coincide
+        by_row = {r - 2: t for t, r in self._rows.items()}
+        ok = [by_row.get(p, tid) == tid for p, tid in zip(df.index, df[ID_COL])]
+        return df[ok][[c for c in cols if c in columns]]
+
+    # ---------- escritura ----------
+    def append(self, trade:dict) -> str:
+        """Agrega un trade nuevo y devuelve su TradeID."""
+        tid = trade.get(ID_COL) or new_trade_id()
+        trade = {**trade, ID_COL: tid}
+        resp = with_retry(self.ws.append_row, [_cell(trade.get(c,"")) for c in HEADER])
+        m = re.search(r"![A-Z]+(\d+)", str(resp.get("updates",{})
+                                             .get("updatedRange","")))
+        if m:
+            self._rows[tid] = int(m.group(1))
+        return tid
+
+    def append_many(self, trades) -> list:
+        """Agrega varios trades en un solo ``append_rows``; devuelve sus IDs."""
+        trades = [{**t, ID_COL: t.get(ID_COL) or new_trade_id()} for t in trades]
+        if not trades:
+            return []
+        resp = with_retry(self.ws.append_rows,
+                          [[_cell(t.get(c,"")) for c in HEADER] for t in trades])
+        m = re.search(r"![A-Z]+(\d+)", str((resp or {}).get("updates",{})
+                                             .get("updatedRange","")))
+        if m:
+            for k, t in enumerate(trades):
+                self._rows[t[ID_COL]] = int(m.group(1)) + k
+        return [t[ID_COL] for t in trades]
+
+    def stage(self, trade_id:str, changes:dict):
+        """Encola cambios de un trade; varias llamadas se fusionan.
+
+        Un trade sin ID (fila aún sin backfill) o fuera del mapa no se puede
+        editar: ``ConflictError``."""
+        if not trade_id or trade_id not in self._rows:
+            raise ConflictError([trade_id])
+        changes = {c: _cell(v) for c, v in changes.items()
+                   if c in HEADER and c != ID_COL}
+        self._pending.setdefault(trade_id, {}).update(changes)
+
+    def discard(self):
+        self._pending = {}
+
+    def _relocate(self):
+        """Relee solo la columna de IDs y rehace el mapa de filas."""
+        ids = with_retry(self.ws.col_values, HEADER.index(ID_COL)+1)[1:]
+        self._rows = {tid: pos+2 for pos, tid in enumerate(ids) if tid}
+
+    def _fetch(self, ids):
+        last = col_letter(len(HEADER))
+        rngs = [f"A{self._rows[t]}:{last}{self._rows[t]}" for t in ids]
+        got  = with_retry(self.ws.batch_get, rngs)
+        return {t: _pad(vr[0] if vr else []) for t, vr in zip(ids, got)}
+
+    def commit(self) -> int:
+        """Verifica versiones y envía todo lo pendiente en un solo request.
+
+        Si otra sesión insertó/borró filas se relee la columna de IDs; si el
+        contenido de alguna fila cambió se lanza ``ConflictError`` sin
+        escribir nada.
+        """
+        if not self._pending:
+            return 0
+        ids  = list(self._pending)
+        id_i = HEADER.index(ID_COL)
+
+        cur = self._fetch([t for t in ids if t in self._rows])
+        if any(t not in cur or cur[t][id_i] != t for t in ids):
+            self._relocate()
+            gone = [t for t in ids if t not in self._rows]
+            if gone:
+                raise ConflictError(gone)
+            cur = self._fetch(ids)
+
+        stale = [t for t in ids if self._ver.get(t) is not None
+                 and row_version(cur[t]) != self._ver[t]]
+        if stale:
+            raise ConflictError(stale)
+
+        data = []
+        for t in ids:
+            row, chg = self._rows[t], self._pending[t]
+            for a, b in _runs(HEADER.index(c) for c in chg):
+                cols = HEADER[a:b+1]
+                data.append({
+                    "range": f"{col_letter(a+1)}{row}:{col_letter(b+1)}{row}",
+                    "values": [[chg[c] for c in cols]],
+                })
+        with_retry(self.ws.batch_update, data)
+
+        # la versión nueva solo se conoce releyendo (formato de la hoja):
+        # hasta el próximo load() solo se verifica el ID de esas filas
+        for t in ids:
+            self._ver[t] = None
+        self._pending = {}
+        return len(ids)
+
+    def delete(self, trade_id:str):
+        """Borra la fila del trade (verificando el ID) y corre el mapa."""
+        id_i = HEADER.index(ID_COL)
+        if (trade_id not in self._rows
+                or self._fetch([trade_id])[trade_id][id_i] != trade_id):
+            self._relocate()
+            if not trade_id or trade_id not in self._rows:
+                raise ConflictError([trade_id])
+        row = self._rows.pop(trade_id)
+        with_retry(self.ws.delete_rows, row)
+        self._ver.pop(trade_id, None); self._pending.pop(trade_id, None)
+        self._rows = {t: (r-1 if r > row else r) for t, r in self._rows.items()}
@@ -0,0 +1,141 @@
+# ------------------  kpis.py  ------------------
+"""Cálculo de KPIs del journal sin Streamlit (lo usan los dashboards y el CLI)."""
+import math
+import numpy as np, pandas as pd
+
+INITIAL_CAP        = 60000
+RISK_PCT           = 0.0025          # riesgo por trade (fracción del capital)
+COMMISSION_PER_LOT = 4.0
+DD_LIMIT_PCT       = 0.10
+PHASE_TARGETS      = (0.08, 0.13)    # Fase 1 / Fase 2
+
+NUM_COLS = ["Volume","Gross_USD","Commission","USD","R"]
+
+
+def true_commission(vol: float) -> float:
+    return round(vol * COMMISSION_PER_LOT, 2)
+
+def calc_r(net: float, initial_cap: float = INITIAL_CAP) -> float:
+    risk = initial_cap * RISK_PCT
+    return round(net / risk, 2) if risk else 0
+
+def to_numeric(df: pd.DataFrame) -> pd.DataFrame:
+    """Copia con las columnas numéricas coercionadas ("" → NaN)."""
+    df = df.copy()
+    cols = [c for c in NUM_COLS if c in df.columns]
+    df[cols] = df[cols].apply(pd.to_numeric, errors="coerce")
+    if "Datetime" not in df.columns and {"Fecha","Hora"} <= set(df.columns):
+        df["Datetime"] = pd.to_datetime(df["Fecha"].astype(str)+" "+
+                                        df["Hora"].astype(str), errors="coerce")
+    return df
+
+def real_trades(df: pd.DataFrame) -> pd.DataFrame:
+    """Trades reales del panel de KPIs: todo menos las filas de ajuste."""
+    return to_numeric(df[df["Win/Loss/BE"] != "Adj"])
+
+def executed_trades(df: pd.DataFrame) -> pd.DataFrame:
+    """Base de rachas, drawdown, ratios y resúmenes semanales / mensuales:
+    todo menos las ideas no ejecutadas, ordenado por fecha."""
+    return to_numeric(df[df["IsIdeaOnly"] != "Yes"]).sort_values("Datetime")
+
+
+# ---------- panel principal ----------
+def kpi_summary(df_real: pd.DataFrame, initial_cap: float = INITIAL_CAP) -> dict:
+    """Todos los números del panel 📊 Métricas / KPIs."""
+    res   = df_real["Win/Loss/BE"]
+    usd   = df_real["USD"]
+    total  = len(df_real)
+    wins   = int((res=="Win").sum())
+    losses = int((res=="Loss").sum())
+    be_tr  = int((res=="BE").sum())
+
+    gross_p = float(usd[usd>0].sum())
+    gross_l = float(usd[usd<0].sum())
+    net_p   = float(usd.sum())
+
+    risk_amt   = initial_cap*RISK_PCT
+    current_eq = initial_cap + net_p
+    dd_limit   = initial_cap*(1-DD_LIMIT_PCT)
+    dist_dd    = current_eq-dd_limit
+    f1_target, f2_target = (initial_cap*(1+p) for p in PHASE_TARGETS)
+    dist_f1, dist_f2 = f1_target-current_eq, f2_target-current_eq
+    r_f1, r_f2 = max(dist_f1,0)/risk_amt, max(dist_f2,0)/risk_amt
+
+    conv_yes = int(((res=="Loss") &
+                    (df_real.get("SecondTradeValid?")=="Yes")).sum())
+
+    out = dict(
+        total=total, wins=wins, losses=losses, be=be_tr,
+        win_rate=round(100*wins/total,2) if total else 0,
+        gross_profit=gross_p, gross_loss=gross_l, net_profit=net_p,
+        commissions=float(df_real["Commission"].sum()),
+        profit_factor=round(abs(gross_p/gross_l),2) if gross_l else 0,
+        payoff=(round(usd[usd>0].mean() / abs(usd[usd<0].mean()),2)
+                if losses else 0),
+        equity=current_eq,
+        pct_change=100*(current_eq-initial_cap)/initial_cap,
+        dd_limit=dd_limit, dist_dd=dist_dd,
+        trades_to_burn=math.ceil(abs(dist_dd)/risk_amt),
+        f1_target=f1_target, f2_target=f2_target,
+        dist_f1=dist_f1, dist_f2=dist_f2, f1_done=dist_f1<=0,
+        r_total=net_p/risk_amt, r_f1=r_f1, r_f2=r_f2,
+        pct_f1=100*max(dist_f1,0)/initial_cap,
+        pct_f2=100*max(dist_f2,0)/initial_cap,
+        conv_yes=conv_yes, conv_tot=losses,
+        conv_pct=100*conv_yes/losses if losses else 0,
+    )
+    for rr in (3, 4, 5):
+        out[f"t1{rr}_f1"] = max(0, int(np.ceil(r_f1/rr)))
+        out[f"t1{rr}_f2"] = max(0, int(np.ceil(r_f2/rr)))
+    return out
+
+
+# ---------- rachas / drawdown / ratios ----------
+def streaks(results) -> tuple:
+    """(máx wins consecutivos, máx losses consecutivos); BE corta la racha."""
+    s = pd.Series(list(results))
+    if s.empty:
+        return 0, 0
+    runs = s.groupby((s != s.shift()).cumsum())
+    size, kind = runs.size(), runs.first()
+    mxw = int(size[kind=="Win"].max())  if (kind=="Win").any()  else 0
+    mxl = int(size[kind=="Loss"].max()) if (kind=="Loss").any() else 0
+    return mxw, mxl
+
+def equity_curve(df_real: pd.DataFrame, initial_cap: float = INITIAL_CAP) -> pd.DataFrame:
+    df_sorted = df_real.sort_values("Datetime").copy()
+    df_sorted["Equity"] = initial_cap + df_sorted["USD"].cumsum()
+    return df_sorted
+
+def drawdown(eq): return eq.cummax() - eq
+
+def max_drawdown(df_real: pd.DataFrame, initial_cap: float = INITIAL_CAP) -> dict:
+    dd = drawdown(equity_curve(df_real, initial_cap)["Equity"])
+    mx = float(dd.max()) if len(dd) else 0.0
+    return {"usd": round(mx,2), "pct": round(100*mx/initial_cap,2)}
+
+def sharpe_sortino(df_real: pd.DataFrame, initial_cap: float = INITIAL_CAP) -> tuple:
+    """Sharpe / Sortino aproximados sobre PnL diario / capital."""
+    daily_ret = (df_real.groupby(df_real["Datetime"].dt.date)["USD"].sum()
+                 / initial_cap)
+    std = daily_ret.std(ddof=1)
+    sharpe = daily_ret.mean() / std if std else 0
+    downside = daily_ret[daily_ret<0].std(ddof=1)
+    sortino = daily_ret.mean() / downside if downside else 0
+    return float(np.nan_to_num(sharpe)), float(np.nan_to_num(sortino))
+
+
+# ---------- resúmenes ----------
+def week_tag(dt: pd.Series) -> pd.Series:
+    iso = dt.dt.isocalendar()
+    return iso.year.astype(str)+"-W"+iso.week.astype(str)
+
+def period_summary(df_real: pd.DataFrame, period: str) -> pd.DataFrame:
+    """Trades y PnL neto por semana ISO ("W") o por mes ("M")."""
+    if period == "W":
+        tag, name = week_tag(df_real["Datetime"]), "WeekTag"
+    else:
+        tag, name = df_real["Datetime"].dt.strftime("%Y-%m"), "MonthTag"
+    return (df_real.groupby(tag.rename(name))
+                   .agg(Trades=("USD","count"), NetPNL=("USD","sum"))
+                   .reset_index())
@@ -0,0 +1,155 @@
+# ------------------  panels.py  ------------------
+"""Secciones perezosas de los dashboards.
+
+Cada sección es un toggle: cerrada no ejecuta nada; abierta corre como
+``st.fragment``, así sus widgets solo re-ejecutan esa sección. Los cálculos
+pesados se cachean por versión de datos con ``cached`` y las figuras, ya
+serializadas, con ``chart`` (ver ``figcache.py``). Todo pasa por el
+profiler de la sesión (ver ``perf.py``).
+"""
+from contextlib import nullcontext
+import streamlit as st
+import perf, snapshot
+from figcache import FigureCache, as_figure
+
+WATCH_EVERY = "10s"      # cada cuánto se mira el stamp del snapshot
+
+
+# ---------- profiler ----------
+def start_profiler(app:str) -> perf.Profiler:
+    """Profiler de la sesión; cada ejecución completa del script es un rerun nuevo."""
+    prof = st.session_state.get("_perf")
+    if prof is None or prof.app != app:
+        prof = st.session_state["_perf"] = perf.Profiler(app)
+    prof.new_run()
+    return prof
+
+def step(section:str, rows=None):
+    prof = st.session_state.get("_perf")
+    return prof.step(section, rows) if prof else nullcontext({})
+
+@st.cache_resource(show_spinner=False)
+def figure_cache() -> FigureCache:
+    """Una caché de figuras por proceso, compartida entre sesiones."""
+    return FigureCache()
+
+def chart(version:str, section:str, build, params=(), **kw):
+    """``st.plotly_chart(build())`` con la figura cacheada por
+    (versión de datos, sección, parámetros de filtro).
+
+    En un hit ``build`` no corre: se reenvía el JSON guardado.
+    """
+    with step(f"figure:{section}") as rec:
+        spec, hit = figure_cache().get((version, section, tuple(params)), build)
+        rec["cache"], rec["bytes"] = ("hit" if hit else "miss"), len(spec)
+        return st.plotly_chart(as_figure(spec), **kw)
+
+def perf_sidebar():
+    """Panel opcional ⏱ en la barra lateral: rerun actual + histórico."""
+    prof = st.session_state.get("_perf")
+    if prof is None or not st.sidebar.toggle("⏱ Performance", key="perf_on"):
+        return
+    cur = prof.current()
+    st.sidebar.caption(f"rerun {prof.run_id} · release {perf.release()} · "
+                       f"{sum(r['ms'] for r in cur):,.0f} ms")
+    fc = figure_cache().summary()
+    st.sidebar.caption(f"figuras: {fc['hits']} hits / {fc['misses']} misses "
+                       f"({100*fc['hit_rate']:.0f} %) · {fc['entries']} en caché · "
+                       f"{fc['bytes']/1e6:.1f} / {fc['budget']/1e6:.0f} MB · "
+                       f"{fc['evictions']} expulsadas")
+    st.sidebar.dataframe(
+        [{k: r.get(k) for k in ("section","ms","rows","bytes","cache")}
+         for r in cur],
+        hide_index=True, use_container_width=True)
+    if st.sidebar.checkbox("Histórico por release"):
+        st.sidebar.dataframe(perf.summarize(perf.read_log(prof.log_path, prof.app)),
+                             hide_index=True, use_container_width=True)
+
+
+# ---------- snapshot ----------
+def load_journal(store, key:str, backfill:bool=True, columns=None) -> dict:
+    """``{pestaña: DataFrame}`` desde el snapshot local; la hoja (todas las
+    pestañas en un request) se revalida en segundo plano.
+
+    Tras una escritura (``flash``) se lee la hoja directamente. ``columns``:
+    columnas del journal que la app tiene siempre en memoria (p.ej.
+    ``HOT_COLS``); el resto se pide con ``fields``.
+    """
+    with step("sheets:load") as rec:
+        sync = st.session_state.pop("_sync_load", False)
+        frames, version, fresh = snapshot.load(store, key, backfill, sync=sync,
+                                               columns=columns)
+        rec["rows"] = sum(len(f) for f in frames.values())
+        rec["cache"] = "sheet" if fresh else "snapshot"
+    snapshot_watch(key, version)
+    return frames
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def _fields(key:str, version:str, columns:tuple, pos, _store):
+    return snapshot.fields(_store, key, list(columns),
+                           None if pos is None else list(pos))
+
+def fields(store, key:str, columns, pos=None):
+    """Columnas frías de las filas en ``pos`` (índice del DataFrame del
+    journal) o, si un panel las declara, de todas; mismo índice, así se
+    unen con ``df.join`` aunque la fila no tenga ``TradeID``. Cacheadas
+    por versión de datos."""
+    with step(f"sheets:fields:{','.join(columns)}") as rec:
+        out = _fields(key, store.version, tuple(columns),
+                      None if pos is None else tuple(int(p) for p in pos), store)
+        rec["rows"] = len(out)
+    return out
+
+@st.fragment(run_every=WATCH_EVERY)
+def snapshot_watch(key:str, version:str):
+    """Rerun completo cuando otro proceso (o la revalidación) deja una versión nueva."""
+    info = snapshot.stamp(key)
+    if info and info.get("version") != version:
+        st.rerun()
+
+
+# ---------- secciones ----------
+def lazy_panel(title:str, key:str, body, *args, expanded:bool=False):
+    """Muestra ``title`` como toggle y ejecuta ``body(*args)`` solo si está abierto."""
+    if st.toggle(title, value=expanded, key=f"panel_{key}"):
+        with st.container(border=True):
+            st.fragment(_timed(key, body))(*args)
+
+def _timed(key, body):
+    def run(*args):
+        with step(f"panel:{key}"):
+            return body(*args)
+    run.__name__ = run.__qualname__ = body.__name__    # id estable del fragment
+    return run
+
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def _cached(version:str, section:str, _fn, _args, _kw, _miss):
+    _miss.append(True)               # solo corre en un miss
+    return _fn(*_args, **_kw)
+
+def cached(version:str, section:str, fn, *args, **kw):
+    """Resultado de ``fn(*args)`` cacheado por (versión de datos, sección).
+
+    ``section`` debe identificar la función *y* sus parámetros: los
+    argumentos no se hashean (suelen ser DataFrames grandes).
+    """
+    miss = []
+    with step(f"compute:{section}") as rec:
+        out = _cached(version, section, fn, args, kw, miss)
+        rec["cache"] = "miss" if miss else "hit"
+        df = args[0] if args else None
+        rec["rows"] = len(df) if miss and hasattr(df, "__len__") else 0
+    return out
+
+
+def flash(msg:str, kind:str="success"):
+    """Mensaje que sobrevive al ``st.rerun()`` posterior a una escritura;
+    ese rerun lee la hoja en vez del snapshot."""
+    st.session_state["_flash"] = (kind, msg)
+    st.session_state["_sync_load"] = True
+
+def show_flash():
+    kind, msg = st.session_state.pop("_flash", (None, None))
+    if msg:
+        getattr(st, kind)(msg)
@@ -0,0 +1,105 @@
+# ------------------  perf.py  ------------------
+"""Profiler por sección / paso de datos, con log local rotativo.
+
+Cada paso queda como una línea JSON en ``LOG_PATH`` (app, release, rerun,
+sección, ms, filas, bytes de figura) para comparar entre versiones.
+"""
+import json, os, time, uuid, subprocess
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+LOG_PATH = Path(os.environ.get(
+    "QJ_PERF_LOG",
+    Path.home()/".cache"/"quantitative_journal"/"perf.jsonl"))
+LOG_MAX_BYTES = 4_000_000            # al pasarlo se conserva la mitad reciente
+
+_release = None
+
+def release() -> str:
+    """Versión de la app: $QJ_RELEASE o el commit corto de git."""
+    global _release
+    if _release is None:
+        _release = os.environ.get("QJ_RELEASE") or ""
+        if not _release:
+            try:
+                _release = subprocess.run(
+                    ["git", "rev-parse", "--short", "HEAD"],
+                    cwd=Path(__file__).parent, capture_output=True,
+                    text=True, timeout=2).stdout.strip()
+            except (OSError, subprocess.SubprocessError):
+                pass
+        _release = _release or "dev"
+    return _release
+
+
+class Profiler:
+    """Registros del rerun actual + escritura al log rotativo."""
+
+    def __init__(self, app:str, log_path:Path=LOG_PATH, keep:int=500):
+        self.app, self.log_path = app, Path(log_path)
+        self.records = deque(maxlen=keep)
+        self.run_id = ""
+        self.new_run()
+
+    def new_run(self):
+        self.run_id = uuid.uuid4().hex[:8]
+
+    def current(self) -> list:
+        return [r for r in self.records if r["run"] == self.run_id]
+
+    @contextmanager
+    def step(self, section:str, rows=None):
+        """Cronometra el bloque; el dict devuelto acepta ``rows`` / ``bytes``."""
+        rec = {"section": section, "rows": rows, "bytes": None}
+        t0 = time.perf_counter()
+        try:
+            yield rec
+        finally:
+            rec["ms"] = round(1000*(time.perf_counter()-t0), 2)
+            self.record(**rec)
+
+    def record(self, section:str, ms:float, rows=None, bytes=None, **extra):
+        rec = {"ts": round(time.time(), 3), "app": self.app,
+               "release": release(), "run": self.run_id,
+               "section": section, "ms": ms, "rows": rows, "bytes": bytes,
+               **extra}
+        self.records.append(rec)
+        self._write(rec)
+        return rec
+
+    # ---------- log rotativo ----------
+    def _write(self, rec:dict):
+        try:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.log_path, "a", encoding="utf-8") as fh:
+                fh.write(json.dumps(rec, default=str) + "\n")
+            if self.log_path.stat().st_size > LOG_MAX_BYTES:
+                self._trim()
+        except OSError:
+            pass                       # el profiler nunca tumba la app
+
+    def _trim(self):
+        lines = self.log_path.read_text(encoding="utf-8").splitlines(True)
+        tmp = self.log_path.with_suffix(".tmp")
+        tmp.write_text("".join(lines[len(lines)//2:]), encoding="utf-8")
+        os.replace(tmp, self.log_path)
+
+
+def read_log(log_path:Path=LOG_PATH, app:str=None):
+    """DataFrame con el log (filtrado por app si se indica)."""
+    import pandas as pd
+    try:
+        df = pd.read_json(log_path, lines=True)
+    except (ValueError, FileNotFoundError):
+        return pd.DataFrame(columns=["ts","app","release","run","section",
+                                     "ms","rows","bytes"])
+    return df[df["app"] == app] if app and not df.empty else df
+
+def summarize(log) :
+    """p50 / p95 de ms por (release, sección)."""
+    if log.empty:
+        return log
+    g = log.groupby(["release", "section"])["ms"]
+    return (g.agg(n="count", p50="median", p95=lambda s: s.quantile(.95))
+             .round(1).reset_index())
@@ -0,0 +1,185 @@
+# ------------------  reconcile.py  ------------------
+"""Conciliación MT5 ↔ journal por ``Ticket`` (sin Streamlit).
+
+Hash-join vectorizado entre el reporte de MT5 y la hoja: trades que faltan
+en el journal, tickets del journal que MT5 no conoce y diferencias de
+volumen / gross / comisión. Las correcciones salen como cambios por
+TradeID listos para ``TradeStore.stage`` + un único ``commit``.
+"""
+import io
+import numpy as np, pandas as pd
+
+from journal_store import HEADER, ID_COL
+from kpis import calc_r
+
+# ────── mapeo MT5 → internos ──────
+ALIASES = {
+    "position":   "ticket",
+    "time":       "time",
+    "symbol":     "symbol",
+    "type":       "type",
+    "volume":     "volume",
+    "profit":     "profit",
+    "commission": "commission",
+}
+REQ_COLS = {"ticket", "symbol", "volume", "type", "profit", "time"}
+
+TOL_VOLUME = 0.005       # lotes
+TOL_USD    = 0.01
+
+
+def _find_header_row(df_raw: pd.DataFrame) -> int:
+    """Devuelve el índice de la fila cuyo primer valor sea 'Time'."""
+    for i, cell in enumerate(df_raw.iloc[:, 0].fillna("").astype(str)):
+        if cell.strip().lower() == "time":
+            return i
+    return 0
+
+def read_mt5_report(bin_: bytes):
+    """(DataFrame normalizado, columnas faltantes) de un XLSX de MT5."""
+    # 1· leemos bruto (una sola vez) para detectar la fila-encabezado real
+    df_raw = pd.read_excel(io.BytesIO(bin_), header=None, engine="openpyxl")
+    hdr_row = _find_header_row(df_raw)
+
+    # 2· esa fila pasa a ser el encabezado; lo de arriba (títulos) se descarta
+    df = df_raw.iloc[hdr_row+1:].reset_index(drop=True).infer_objects()
+    df.columns = df_raw.iloc[hdr_row].fillna("").astype(str)
+
+    # 3· normalizamos nombres
+    df.columns = [str(c).strip().lower() for c in df.columns]
+    df = df.rename(columns={c: ALIASES[c] for c in df.columns if c in ALIASES})
+    return df, REQ_COLS.difference(df.columns)
+
+
+# ---------- normalización ----------
+def _tickets(s: pd.Series) -> pd.Series:
+    return pd.to_numeric(s, errors="coerce").astype("Int64")
+
+def _mt5_side(mt5: pd.DataFrame) -> pd.DataFrame:
+    m = pd.DataFrame({
+        "Ticket": _tickets(mt5["ticket"]),
+        "Symbol": mt5["symbol"].astype(str),
+        "Type":   np.where(mt5["type"].astype(str).str.lower() == "buy",
+                           "Long", "Short"),
+        "Time":   pd.to_datetime(mt5["time"], errors="coerce"),
+        "Volume": pd.to_numeric(mt5["volume"], errors="coerce"),
+        "Gross":  pd.to_numeric(mt5["profit"], errors="coerce"),
+        # MT5 la reporta negativa; el journal la guarda positiva
+        "Commission": (pd.to_numeric(mt5["commission"], errors="coerce").abs()
+                       if "commission" in mt5 else np.nan),
+    })
+    # filas de totales / balance no tienen ticket; en el reporte de deals
+    # la misma posición aparece en la entrada y en la salida
+    g = m[m["Ticket"].notna()].groupby("Ticket", sort=False)
+    out = g.agg(Symbol=("Symbol","first"), Type=("Type","first"),
+                Time=("Time","last"), Volume=("Volume","max"),
+                Gross=("Gross","sum"))
+    out["Commission"] = g["Commission"].sum(min_count=1)
+    return out.reset_index()
+
+def _journal_side(journal: pd.DataFrame) -> pd.DataFrame:
+    j = journal[journal["Win/Loss/BE"] != "Adj"]
+    return pd.DataFrame({
+        ID_COL:   j[ID_COL],
+        "Ticket": _tickets(j["Ticket"]),
+        "Result": j["Win/Loss/BE"],
+        "Time":   pd.to_datetime(j["Fecha"].astype(str)+" "+j["Hora"].astype(str),
+                                 errors="coerce"),
+        "Volume": pd.to_numeric(j["Volume"], errors="coerce"),
+        "Gross":  pd.to_numeric(j["Gross_USD"], errors="coerce"),
+        "Commission": pd.to_numeric(j["Commission"], errors="coerce"),
+    })
+
+
+# ---------- motor ----------
+def reconcile(mt5: pd.DataFrame, journal: pd.DataFrame,
+              tol_volume: float = TOL_VOLUME, tol_usd: float = TOL_USD) -> dict:
+    """Cruza MT5 y journal por Ticket.
+
+    Devuelve DataFrames ``missing`` (en MT5, no en el journal), ``extra``
+    (ticket del journal que MT5 no tiene, solo dentro del período que cubre
+    el reporte), ``mismatched`` (con columnas
+    ``*_mt5`` / ``*_jr`` / ``d_*``), ``duplicated`` (ticket repetido en el
+    journal) y el conteo ``no_ticket`` de trades sin ticket.
+    """
+    m, j = _mt5_side(mt5), _journal_side(journal)
+    no_ticket = int(j["Ticket"].isna().sum())
+    j = j[j["Ticket"].notna()]
+    dup_mask = j["Ticket"].duplicated(keep=False)
+
+    both = m.merge(j[~dup_mask], on="Ticket", how="outer",
+                   suffixes=("_mt5", "_jr"), indicator=True)
+    side = both.pop("_merge")
+    # un reporte parcial no dice nada de los trades fuera de su rango
+    t = pd.to_datetime(mt5["time"], errors="coerce")
+    in_span = j["Time"].between(t.min(), t.max())
+
+    matched = both[side == "both"].copy()
+    for c in ("Volume", "Gross", "Commission"):
+        matched[f"d_{c}"] = matched[f"{c}_mt5"] - matched[f"{c}_jr"]
+    # en el journal un BE lleva Gross 0 por convención: no se compara
+    bad = ((matched["d_Volume"].abs() > tol_volume) |
+           ((matched["d_Gross"].abs() > tol_usd) & (matched["Result"] != "BE")) |
+           (matched["d_Commission"].abs() > tol_usd))     # NaN → no compara
+
+    return {
+        "missing":    m[m["Ticket"].isin(both.loc[side == "left_only", "Ticket"])],
+        "extra":      j[j["Ticket"].isin(both.loc[side == "right_only", "Ticket"])
+                        & in_span],
+        "mismatched": matched[bad].reset_index(drop=True),
+        "duplicated": j[dup_mask].sort_values("Ticket"),
+        "matched":    int((side == "both").sum()),
+        "no_ticket":  no_ticket,
+    }
+
+
+# ---------- correcciones ----------
+def _result(gross):
+    return "Win" if gross > 0 else "Loss" if gross < 0 else "BE"
+
+def _net(result, gross, comm):
+    if result == "BE":
+        return 0.0, -comm
+    return gross, round(gross - comm, 2)
+
+def propose_corrections(mismatched: pd.DataFrame) -> list:
+    """[(TradeID, {col: valor})] con los valores de MT5 y USD / R recalculados.
+
+    Si el gross de MT5 contradice el resultado del journal (un Win que MT5
+    da en pérdida o al revés) también se corrige ``Win/Loss/BE``; un BE se
+    deja como está (su gross no se compara).
+    """
+    out = []
+    for r in mismatched.to_dict("records"):
+        vol  = round(r["Volume_mt5"], 2)
+        comm = (r["Commission_mt5"] if pd.notna(r["Commission_mt5"])
+                else r["Commission_jr"])
+        res  = r["Result"]
+        if res in ("Win", "Loss") and pd.notna(r["Gross_mt5"]):
+            res = _result(r["Gross_mt5"])
+        gross, net = _net(res, r["Gross_mt5"], comm)
+        chg = {"Volume": vol, "Gross_USD": gross, "Commission": comm,
+               "USD": net, "R": calc_r(net)}
+        if res != r["Result"]:
+            chg["Win/Loss/BE"] = res
+        out.append((r[ID_COL], chg))
+    return out
+
+def missing_rows(missing: pd.DataFrame) -> list:
+    """Trades de MT5 que faltan en el journal, como dicts con todo ``HEADER``."""
+    rows = []
+    for r in missing.to_dict("records"):
+        gross = r["Gross"]
+        comm  = r["Commission"] if pd.notna(r["Commission"]) else 0.0
+        res   = _result(gross)
+        gross, net = _net(res, gross, comm)
+        t = r["Time"]
+        rows.append({**{c: "" for c in HEADER},
+            "Fecha": t.strftime("%Y-%m-%d") if pd.notna(t) else "",
+            "Hora":  t.strftime("%H:%M:%S") if pd.notna(t) else "",
+            "Symbol": r["Symbol"], "Type": r["Type"], "Volume": r["Volume"],
+            "Ticket": int(r["Ticket"]), "Win/Loss/BE": res,
+            "Gross_USD": gross, "Commission": comm, "USD": net,
+            "R": calc_r(net), "Resolved": "No", "IsIdeaOnly": "No",
+        })
+    return rows
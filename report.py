@@ -0,0 +1,151 @@
+# ------------------  report.py  ------------------
+"""Reportes de KPIs sin Streamlit (cron / varias cuentas).
+
+    python report.py journal.csv otra_cuenta.parquet -o reports/
+    python report.py snapshot:<SHEET_KEY> -f md
+    python report.py sheet:<SHEET_KEY> --creds sa.json -f json md
+
+Cada fuente es un snapshot local (.csv / .json / .parquet), el snapshot
+Arrow que mantienen las apps (``snapshot:<key>`` en ``$QJ_SNAPSHOT_DIR`` o
+la ruta a ``journal_<key>.arrow``) o ``sheet:<key>`` para leer la hoja
+directamente (solo lectura).
+"""
+import argparse, json, os, re, sys, time
+from pathlib import Path
+import pandas as pd
+
+from kpis import (INITIAL_CAP, real_trades, executed_trades, kpi_summary,
+                  streaks, max_drawdown, sharpe_sortino, period_summary)
+
+SCOPES = ["https://www.googleapis.com/auth/spreadsheets",
+          "https://www.googleapis.com/auth/drive"]
+
+
+# ---------- carga ----------
+def load_arrow(key: str, snap_dir=None) -> pd.DataFrame:
+    """Journal desde el snapshot compartido de las apps (ver ``snapshot.py``)."""
+    # import diferido: pyarrow y gspread solo hacen falta para este formato
+    import snapshot
+    from journal_store import HEADER, _frame
+    snap = snapshot.read(key, snap_dir=snap_dir)
+    if snap is None:
+        raise ValueError(f"sin snapshot válido para {key[:12]}")
+    return _frame(snap["journal"][0], HEADER)
+
+def load_snapshot(path: Path) -> pd.DataFrame:
+    ext = path.suffix.lower()
+    if ext == ".arrow":
+        m = re.fullmatch(r"journal_(\w+)\.arrow", path.name)
+        if not m:
+            raise ValueError(f"{path.name}: se espera el journal_<key>.arrow")
+        return load_arrow(m.group(1), path.parent)
+    if ext == ".parquet":
+        return pd.read_parquet(path)
+    if ext == ".json":
+        return pd.read_json(path, orient="records", dtype=False)
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+def load_sheet(key: str, creds_path: str) -> pd.DataFrame:
+    # import diferido: con snapshots no hace falta gspread ni google-auth
+    import gspread
+    from google.oauth2.service_account import Credentials
+    from journal_store import TradeStore
+    creds = Credentials.from_service_account_file(creds_path, scopes=SCOPES)
+    ws = gspread.authorize(creds).open_by_key(key).worksheet("sheet1")
+    return TradeStore(ws).load(backfill=False)
+
+def load_source(src: str, creds_path: str):
+    """(nombre de cuenta, DataFrame) para una fuente de la línea de comandos."""
+    if src.startswith("sheet:"):
+        key = src.split(":", 1)[1]
+        return key[:8], load_sheet(key, creds_path)
+    if src.startswith("snapshot:"):
+        key = src.split(":", 1)[1]
+        return key[:8], load_arrow(key)
+    p = Path(src)
+    return p.stem, load_snapshot(p)
+
+
+# ---------- reporte ----------
+def build_report(df: pd.DataFrame, initial_cap: float = INITIAL_CAP) -> dict:
+    """KPIs + rachas + drawdown + resúmenes, con las mismas funciones y los
+    mismos filtros de fila que los dashboards."""
+    ex = executed_trades(df)
+    mxw, mxl = streaks(ex["Win/Loss/BE"])
+    sharpe, sortino = sharpe_sortino(ex, initial_cap)
+    return {
+        "kpis": kpi_summary(real_trades(df), initial_cap),
+        "streaks": {"max_wins": mxw, "max_losses": mxl},
+        "drawdown": max_drawdown(ex, initial_cap),
+        "ratios": {"sharpe": round(sharpe,4), "sortino": round(sortino,4)},
+        "weekly": period_summary(ex, "W"),
+        "monthly": period_summary(ex, "M"),
+    }
+
+def to_markdown(name: str, rep: dict) -> str:
+    k = rep["kpis"]
+    lines = [f"# Reporte · {name}", "",
+             "| KPI | Valor |", "|---|---|"]
+    for label, key in [("Total Trades","total"), ("Win Rate %","win_rate"),
+                       ("Profit Factor","profit_factor"), ("Payoff","payoff"),
+                       ("Net Profit","net_profit"), ("Equity","equity"),
+                       ("R acumuladas","r_total"), ("Dist. DD","dist_dd")]:
+        v = k[key]
+        lines.append(f"| {label} | {v:,.2f} |" if isinstance(v, float)
+                     else f"| {label} | {v} |")
+    s, d, r = rep["streaks"], rep["drawdown"], rep["ratios"]
+    lines += [f"| Max Wins / Losses seguidos | {s['max_wins']} / {s['max_losses']} |",
+              f"| Máx Drawdown | {d['usd']:,.2f} USD ({d['pct']} %) |",
+              f"| Sharpe / Sortino | {r['sharpe']:.2f} / {r['sortino']:.2f} |"]
+    for title, key in [("Semanal","weekly"), ("Mensual","monthly")]:
+        tab = rep[key]
+        lines += ["", f"## {title}", "",
+                  "| " + " | ".join(tab.columns) + " |",
+                  "|" + "---|"*len(tab.columns)]
+        lines += ["| " + " | ".join(f"{v:,.2f}" if isinstance(v, float) else str(v)
+                                    for v in row) + " |"
+                  for row in tab.itertuples(index=False)]
+    return "\n".join(lines) + "\n"
+
+def write_report(name: str, rep: dict, out: Path, formats):
+    out.mkdir(parents=True, exist_ok=True)
+    if "json" in formats:
+        payload = {k: (v.to_dict(orient="records") if isinstance(v, pd.DataFrame)
+                       else v) for k, v in rep.items()}
+        (out/f"{name}.json").write_text(json.dumps(payload, indent=2, default=float))
+    if "csv" in formats:
+        pd.DataFrame([rep["kpis"]]).to_csv(out/f"{name}_kpis.csv", index=False)
+        rep["weekly"].to_csv(out/f"{name}_weekly.csv", index=False)
+        rep["monthly"].to_csv(out/f"{name}_monthly.csv", index=False)
+    if "md" in formats:
+        (out/f"{name}.md").write_text(to_markdown(name, rep))
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("sources", nargs="+",
+                    help="snapshot (.csv/.json/.parquet/.arrow), "
+                         "snapshot:<key> o sheet:<key>")
+    ap.add_argument("-o", "--out-dir", default="reports")
+    ap.add_argument("-f", "--formats", nargs="+", default=["json","csv","md"],
+                    choices=["json","csv","md"])
+    ap.add_argument("--initial-cap", type=float, default=INITIAL_CAP)
+    ap.add_argument("--creds", default=os.environ.get("GOOGLE_APPLICATION_CREDENTIALS"),
+                    help="JSON de la service account (solo para sheet:<key>)")
+    args = ap.parse_args(argv)
+
+    out, rc = Path(args.out_dir), 0
+    for src in args.sources:
+        t0 = time.perf_counter()
+        try:
+            name, df = load_source(src, args.creds)
+            write_report(name, build_report(df, args.initial_cap),
+                         out, args.formats)
+        except Exception as e:          # una cuenta rota no frena las demás
+            print(f"✗ {src}: {e}", file=sys.stderr); rc = 1
+            continue
+        print(f"✓ {name}: {len(df)} filas en {time.perf_counter()-t0:.3f}s")
+    return rc
+
+if __name__ == "__main__":
+    sys.exit(main())
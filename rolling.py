@@ -0,0 +1,114 @@
+# ------------------  rolling.py  ------------------
+"""Métricas en ventana móvil (últimos N trades o N días) en O(n).
+
+Se calculan una sola vez las sumas prefijo de cada agregado por "bucket"
+(un trade, o un día) y cada ventana es una resta vectorizada
+``P[i] - P[i-w]``; varias ventanas cuestan una resta más cada una.
+
+    python rolling.py            # benchmark con 1M trades sintéticos
+"""
+import numpy as np, pandas as pd
+
+METRICS = ["expectancy", "win_rate", "profit_factor", "sharpe", "sortino",
+           "avg_loss"]
+
+# filas de la matriz de prefijos
+_N, _S, _SS, _POS, _NEG, _NEG2, _W, _L, _LS = range(9)
+
+
+def _buckets(r, wins, losses, keys=None) -> np.ndarray:
+    """Agregados por bucket, forma (9, n_buckets). ``keys`` agrupa (p.ej. días)."""
+    neg = np.minimum(r, 0.0)
+    cols = np.vstack([np.ones_like(r), r, r*r, np.maximum(r, 0.0), neg, neg*neg,
+                      wins, losses, np.where(losses, r, 0.0)]).astype(float)
+    if keys is None:
+        return cols
+    # keys ya ordenadas: reduceat sobre el inicio de cada grupo
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return np.add.reduceat(cols, starts, axis=1)
+
+def _prefix(agg: np.ndarray) -> np.ndarray:
+    out = np.zeros((agg.shape[0], agg.shape[1]+1))
+    np.cumsum(agg, axis=1, out=out[:, 1:])
+    return out
+
+def _window(P: np.ndarray, w: int) -> dict:
+    """Métricas de todas las ventanas de tamaño ``w`` (terminadas en w-1..n-1)."""
+    A = P[:, w:] - P[:, :-w]
+    n, s, ss = A[_N], A[_S], A[_SS]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = s / n
+        var  = np.clip((ss - s*s/n) / (n-1), 0, None)
+        down = np.sqrt(A[_NEG2] / n)          # desviación a la baja (target 0)
+        return {
+            "expectancy":    mean,
+            "win_rate":      100 * A[_W] / n,
+            "profit_factor": np.where(A[_NEG] < 0, A[_POS] / -A[_NEG], np.nan),
+            "sharpe":        np.where(var > 0, mean / np.sqrt(var), np.nan),
+            "sortino":       np.where(down > 0, mean / down, np.nan),
+            "avg_loss":      np.where(A[_L] > 0, A[_LS] / A[_L], np.nan),
+        }
+
+
+def rolling_metrics(r, windows, wins=None, losses=None, keys=None) -> dict:
+    """{w: {métrica: array}} para cada ventana en un solo pase de prefijos.
+
+    ``r``: R por trade en orden cronológico. ``wins`` / ``losses``: máscaras
+    de Win / Loss (por defecto por el signo de ``r``). ``keys``: etiqueta
+    ordenada por trade para ventanas por bucket (p.ej. fecha → "últimos N
+    días operados").
+    """
+    r = np.asarray(r, dtype=float)
+    r = np.where(np.isfinite(r), r, 0.0)
+    wins   = (r > 0) if wins   is None else np.asarray(wins, dtype=bool)
+    losses = (r < 0) if losses is None else np.asarray(losses, dtype=bool)
+    P = _prefix(_buckets(r, wins, losses,
+                         None if keys is None else np.asarray(keys)))
+    nb = P.shape[1] - 1
+    return {w: _window(P, w) for w in windows if 0 < w <= nb}
+
+
+def rolling_frame(df_real: pd.DataFrame, windows, by: str = "trades") -> pd.DataFrame:
+    """Formato largo para graficar: Datetime, window, y una columna por métrica.
+
+    ``by="trades"`` → últimos N trades; ``by="days"`` → últimos N días operados.
+    """
+    # sin fecha no hay punto en el eje x (y con "days" abrirían un día NaT)
+    d = df_real[df_real["Datetime"].notna()].sort_values("Datetime")
+    r = pd.to_numeric(d["R"], errors="coerce").to_numpy()
+    res  = d["Win/Loss/BE"].to_numpy()
+    if by == "days":
+        day = d["Datetime"].dt.normalize()
+        keys = day.to_numpy()
+        ends = day.drop_duplicates().to_numpy()
+    else:
+        keys, ends = None, d["Datetime"].to_numpy()
+
+    frames = []
+    for w, m in rolling_metrics(r, windows, res == "Win", res == "Loss",
+                                keys).items():
+        f = pd.DataFrame(m)
+        f.insert(0, "window", f"{w} {by}")
+        f.insert(0, "Datetime", ends[w-1:])
+        frames.append(f)
+    if not frames:
+        return pd.DataFrame(columns=["Datetime", "window", *METRICS])
+    return pd.concat(frames, ignore_index=True)
+
+
+if __name__ == "__main__":
+    import time
+    rng = np.random.default_rng(0)
+    n = 1_000_000
+    res = rng.choice(["Win", "Loss", "BE"], n, p=[.4, .5, .1])
+    r = np.where(res == "Win", rng.uniform(1, 4, n),
+                 np.where(res == "Loss", -1.0, -0.03))
+    df = pd.DataFrame({"Datetime": pd.date_range("2000-01-01", periods=n, freq="37min"),
+                       "R": r, "Win/Loss/BE": res})
+    t0 = time.perf_counter()
+    rolling_metrics(df["R"].to_numpy(), [20, 50, 100, 500])
+    print(f"motor  [20, 50, 100, 500]: {time.perf_counter()-t0:.3f}s")
+    for by, windows in (("trades", [20, 50, 100, 500]), ("days", [5, 20, 60])):
+        t0 = time.perf_counter()
+        out = rolling_frame(df, windows, by)
+        print(f"{by:6s} {windows}: {len(out):,} filas en {time.perf_counter()-t0:.3f}s")
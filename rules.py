@@ -0,0 +1,215 @@
+# ------------------  rules.py  ------------------
+"""Reglas de prop-firm: pérdida diaria, DD estático / trailing, objetivos,
+días mínimos y consistencia.
+
+``RuleEngine.from_history`` recorre todo el historial en un pase vectorizado
+y deja el estado final; desde ahí cada trade nuevo se aplica con ``push`` en
+O(1). ``preview`` evalúa un trade sin registrarlo (para avisar antes de
+"Agregar Trade").
+
+    python rules.py            # benchmark con 1M trades sintéticos
+"""
+import numpy as np, pandas as pd
+
+from kpis import INITIAL_CAP, RISK_PCT, DD_LIMIT_PCT, PHASE_TARGETS
+
+DEFAULT_RULES = {
+    "daily_loss_pct":  0.05,           # del capital inicial, por día operado
+    "max_dd_pct":      DD_LIMIT_PCT,
+    "dd_mode":         "static",       # "static" | "trailing" (desde el pico)
+    "targets":         PHASE_TARGETS,
+    "min_days":        4,
+    "consistency_pct": 0.0,            # mejor día ≤ % del profit total (0 = off)
+}
+RULE_NAMES = {"daily_loss": "pérdida diaria", "max_dd": "drawdown máximo"}
+NEAR_R = 1.0        # "a punto de romper": margen menor a N trades de riesgo
+
+
+class RuleEngine:
+    """Estado incremental de las reglas sobre el equity de trades cerrados."""
+
+    def __init__(self, initial_cap: float = INITIAL_CAP, rules: dict = None):
+        self.cap   = float(initial_cap)
+        self.rules = {**DEFAULT_RULES, **(rules or {})}
+        self.daily_amt = self.rules["daily_loss_pct"] * self.cap
+        self.dd_amt    = self.rules["max_dd_pct"] * self.cap
+        self.risk_amt  = self.cap * RISK_PCT
+        self.n, self.equity, self.peak = 0, self.cap, self.cap
+        self.day, self.day_pnl, self.days = None, 0.0, 0
+        self.best_closed = 0.0          # mejor día ya cerrado
+        self.day_hit = self.dd_hit = False
+        self.target_at = [None] * len(self.rules["targets"])   # (n, fecha)
+        self.breaches = []              # {rule, n, Datetime, value, limit}
+
+    # ---------- estado ----------
+    def floor(self, peak=None) -> float:
+        base = self.cap if self.rules["dd_mode"] == "static" else \
+               (self.peak if peak is None else peak)
+        return base - self.dd_amt
+
+    def _next(self, dt, usd: float):
+        """(nuevo estado, eventos) tras un trade, sin modificar ``self``."""
+        day = pd.Timestamp(dt).normalize()
+        new_day = day != self.day
+        st = dict(
+            n=self.n + 1, equity=self.equity + usd, day=day,
+            day_pnl=usd if new_day else self.day_pnl + usd,
+            days=self.days + new_day,
+            best_closed=(max(self.best_closed, self.day_pnl)
+                         if new_day and self.day is not None else self.best_closed),
+            day_hit=False if new_day else self.day_hit,
+        )
+        st["peak"] = max(self.peak, st["equity"])
+        floor = self.floor(st["peak"])
+
+        ev = []
+        if st["day_pnl"] <= -self.daily_amt and not st["day_hit"]:
+            ev.append(("daily_loss", st["day_pnl"], -self.daily_amt))
+        st["day_hit"] = st["day_hit"] or st["day_pnl"] <= -self.daily_amt
+        st["dd_hit"] = st["equity"] <= floor
+        if st["dd_hit"] and not self.dd_hit:
+            ev.append(("max_dd", st["equity"], floor))
+        tgt = list(self.target_at)
+        for i, p in enumerate(self.rules["targets"]):
+            if tgt[i] is None and st["equity"] >= self.cap * (1 + p):
+                tgt[i] = (st["n"], pd.Timestamp(dt))
+        st["target_at"] = tgt
+        events = [{"rule": r, "n": st["n"], "Datetime": pd.Timestamp(dt),
+                   "value": round(v, 2), "limit": round(l, 2)} for r, v, l in ev]
+        return st, events
+
+    def push(self, dt, usd: float) -> list:
+        """Aplica un trade (O(1)); devuelve los quiebres que provoca."""
+        st, events = self._next(dt, usd)
+        self.__dict__.update(st)
+        self.breaches.extend(events)
+        return events
+
+    def preview(self, dt, usd: float) -> list:
+        """[(nivel, mensaje)] para un trade aún no registrado."""
+        st, events = self._next(dt, usd)
+        out = [("error", f"❌ Este trade rompe la regla de {RULE_NAMES[e['rule']]} "
+                         f"({e['value']:,.2f} vs límite {e['limit']:,.2f})")
+               for e in events]
+        if st["day"] == self.day and self.day_hit:
+            out.append(("error", "❌ Ese día ya superó la pérdida diaria."))
+        if self.dd_hit:
+            out.append(("error", "❌ La cuenta ya está por debajo del DD máximo."))
+        near = NEAR_R * self.risk_amt
+        room_day = st["day_pnl"] + self.daily_amt
+        room_dd  = st["equity"] - self.floor(st["peak"])
+        if 0 < room_day < near:
+            out.append(("warning", f"⚠️ Quedarían {room_day:,.2f} USD de pérdida "
+                                   f"diaria (< {NEAR_R:g} R)."))
+        if 0 < room_dd < near:
+            out.append(("warning", f"⚠️ Quedarían {room_dd:,.2f} USD hasta el "
+                                   f"DD máximo (< {NEAR_R:g} R)."))
+        return out
+
+    # ---------- historial ----------
+    @classmethod
+    def from_history(cls, df_real: pd.DataFrame, initial_cap: float = INITIAL_CAP,
+                     rules: dict = None) -> "RuleEngine":
+        """Todo el historial en un pase vectorizado (mismo resultado que ``push``)."""
+        eng = cls(initial_cap, rules)
+        d = df_real[df_real["Win/Loss/BE"] != "Adj"].sort_values("Datetime")
+        d = d[d["Datetime"].notna()]
+        if d.empty:
+            return eng
+        usd = pd.to_numeric(d["USD"], errors="coerce").fillna(0.0).to_numpy(float)
+        dts = d["Datetime"].to_numpy(dtype="datetime64[ns]")
+        day = dts.astype("datetime64[D]")
+        n = len(usd)
+
+        eq   = eng.cap + np.cumsum(usd)
+        peak = np.maximum(np.maximum.accumulate(eq), eng.cap)
+        floor = (np.full(n, eng.cap) if eng.rules["dd_mode"] == "static"
+                 else peak) - eng.dd_amt
+
+        # P&L acumulado dentro de cada día
+        start = np.r_[True, day[1:] != day[:-1]]
+        gid   = np.cumsum(start) - 1
+        starts = np.flatnonzero(start)
+        cs = np.cumsum(usd)
+        day_pnl = cs - (cs - usd)[starts][gid]
+        day_mask = day_pnl <= -eng.daily_amt
+        mc = np.cumsum(day_mask)
+        day_first = day_mask & (mc - (mc - day_mask)[starts][gid] == 1)
+
+        dd_mask = eq <= floor
+        dd_first = dd_mask & ~np.r_[False, dd_mask[:-1]]
+
+        ev = [("daily_loss", i, day_pnl[i], -eng.daily_amt)
+              for i in np.flatnonzero(day_first)]
+        ev += [("max_dd", i, eq[i], floor[i]) for i in np.flatnonzero(dd_first)]
+        eng.breaches = [{"rule": r, "n": int(i) + 1,
+                         "Datetime": pd.Timestamp(dts[i]),
+                         "value": round(float(v), 2), "limit": round(float(l), 2)}
+                        for r, i, v, l in sorted(ev, key=lambda e: e[1])]
+        for k, p in enumerate(eng.rules["targets"]):
+            hit = np.flatnonzero(eq >= eng.cap * (1 + p))
+            if len(hit):
+                eng.target_at[k] = (int(hit[0]) + 1, pd.Timestamp(dts[hit[0]]))
+
+        day_tot = day_pnl[np.r_[starts[1:] - 1, n - 1]]
+        eng.n, eng.equity, eng.peak = n, float(eq[-1]), float(peak[-1])
+        eng.day, eng.day_pnl = pd.Timestamp(day[-1]), float(day_pnl[-1])
+        eng.days = len(starts)
+        eng.best_closed = max(0.0, float(day_tot[:-1].max())) if len(starts) > 1 else 0.0
+        eng.day_hit = bool(day_mask[starts[-1]:].any())
+        eng.dd_hit  = bool(dd_mask[-1])
+        return eng
+
+    # ---------- tablero ----------
+    def status(self) -> pd.DataFrame:
+        """Una fila por regla: límite, valor actual, margen y estado."""
+        near = NEAR_R * self.risk_amt
+        def state(room, hit=False):
+            return "❌" if hit or room <= 0 else "⚠️" if room < near else "✅"
+
+        floor = self.floor()
+        rows = [
+            ("Pérdida diaria (último día)", -self.daily_amt, self.day_pnl,
+             self.day_pnl + self.daily_amt,
+             state(self.day_pnl + self.daily_amt, self.day_hit)),
+            (f"DD máximo ({self.rules['dd_mode']})", floor, self.equity,
+             self.equity - floor, state(self.equity - floor, self.dd_hit)),
+        ]
+        for at, p in zip(self.target_at, self.rules["targets"]):
+            tgt = self.cap * (1 + p)
+            rows.append((f"Objetivo +{100*p:g} %", tgt, self.equity,
+                         tgt - self.equity,
+                         f"✅ trade {at[0]} · {at[1]:%Y-%m-%d}" if at else "⏳"))
+        rows.append(("Días operados", self.rules["min_days"], self.days,
+                     max(0, self.rules["min_days"] - self.days),
+                     "✅" if self.days >= self.rules["min_days"] else "⏳"))
+        pct = self.rules["consistency_pct"]
+        if pct:
+            profit = self.equity - self.cap
+            best = max(self.best_closed, self.day_pnl)
+            share = best / profit if profit > 0 else np.nan
+            rows.append((f"Consistencia (mejor día ≤ {100*pct:g} %)", 100 * pct,
+                         round(100 * share, 2), round(100 * (pct - share), 2),
+                         "⏳" if profit <= 0 else "✅" if share <= pct else "❌"))
+        return pd.DataFrame(rows, columns=["Regla", "Límite", "Actual",
+                                           "Margen", "Estado"]).round(2)
+
+
+if __name__ == "__main__":
+    import time
+    rng = np.random.default_rng(0)
+    n = 1_000_000
+    res = rng.choice(["Win", "Loss", "BE"], n, p=[.4, .5, .1])
+    df = pd.DataFrame({
+        "Datetime": pd.date_range("2000-01-01", periods=n, freq="37min"),
+        "Win/Loss/BE": res,
+        "USD": np.where(res == "Win", rng.uniform(150, 600, n),
+                        np.where(res == "Loss", -150.0, -4.0))})
+    t0 = time.perf_counter()
+    eng = RuleEngine.from_history(df, rules={"dd_mode": "trailing"})
+    print(f"historial {n:,} trades: {time.perf_counter()-t0:.3f}s, "
+          f"{len(eng.breaches)} quiebres")
+    t0 = time.perf_counter()
+    for dt, usd in zip(df["Datetime"].iloc[:10_000], df["USD"].iloc[:10_000]):
+        eng.push(dt, usd)
+    print(f"push: {1e6*(time.perf_counter()-t0)/10_000:.1f} µs/trade")
@@ -0,0 +1,224 @@
+# ------------------  snapshot.py  ------------------
+"""Snapshot local del journal (stale-while-revalidate) compartido entre apps.
+
+La última lectura buena de cada pestaña del registro (``TABS``) queda en un
+archivo Arrow IPC sin comprimir (se abre con ``memory_map``); el del journal
+lleva además la versión de cada fila. Un ``.stamp.json`` pequeño guarda la
+versión conjunta y ``.checked`` (solo su mtime) la última revisión contra
+la hoja, aparte para que marcarla no pise un stamp nuevo. El snapshot
+siempre está completo; cada lector toma solo las columnas que pide (las
+demás ni se decodifican) y ``fields`` sirve las frías por fila o por
+columna cuando se necesitan. Cada proceso arranca desde el snapshot, revalida contra Sheets en un hilo aparte y los
+demás procesos detectan la versión nueva leyendo solo el stamp.
+"""
+import json, os, threading, time
+from pathlib import Path
+import pyarrow as pa
+
+import pandas as pd
+from journal_store import (HEADER, ID_COL, JOURNAL_TAB, TABS, TradeStore,
+                           row_version, fetch_tabs, tab_frame, project, _frame)
+
+SNAP_DIR = Path(os.environ.get(
+    "QJ_SNAPSHOT_DIR", Path.home()/".cache"/"quantitative_journal"))
+REVALIDATE_S = 20        # antigüedad máxima antes de volver a mirar la hoja
+
+_lock = threading.Lock()
+_inflight = set()
+
+
+def _path(key: str, tab: str = JOURNAL_TAB) -> Path:
+    suffix = "" if tab == JOURNAL_TAB else f".{tab}"
+    return SNAP_DIR / f"journal_{key[:12]}{suffix}.arrow"
+
+def _stamp_path(key: str) -> Path:
+    return SNAP_DIR / f"journal_{key[:12]}.stamp.json"
+
+def _checked_path(key: str) -> Path:
+    return SNAP_DIR / f"journal_{key[:12]}.checked"
+
+def _replace(path: Path, write):
+    """Escritura atómica: tmp propio del proceso + ``os.replace``."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    write(tmp)
+    os.replace(tmp, path)
+
+
+# ---------- stamp ----------
+def stamp(key: str) -> dict:
+    """``{version, rows, saved, checked}`` del último snapshot (o None)."""
+    try:
+        info = json.loads(_stamp_path(key).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    try:
+        info["checked"] = max(info.get("checked", 0),
+                              _checked_path(key).stat().st_mtime)
+    except OSError:
+        pass
+    return info
+
+def _write_stamp(key: str, **info):
+    _replace(_stamp_path(key), lambda p: p.write_text(json.dumps(info),
+                                                    encoding="utf-8"))
+
+def _touch(key: str):
+    """Marca el snapshot como recién revisado (evita revalidar en paralelo).
+
+    Solo toca ``.checked``: reescribir el stamp podría republicar una
+    versión vieja si otro proceso hace ``write`` entre medio."""
+    try:
+        _checked_path(key).touch()
+    except OSError:
+        pass
+
+
+# ---------- datos ----------
+def data_version(journal_version: str, tabs: dict) -> str:
+    """Versión conjunta: journal + resto de pestañas del registro."""
+    return row_version([journal_version] +
+                       [row_version(row_version(r) for r in tabs[t]) for t in sorted(tabs)])
+
+def _table(header, rows, extra=None, **meta) -> pa.Table:
+    cols = list(zip(*rows)) if rows else [()] * len(header)
+    arrays = {h: pa.array(c, pa.string()) for h, c in zip(header, cols)}
+    return pa.table({**arrays, **(extra or {})}, metadata=meta)
+
+def _write_table(path: Path, table: pa.Table):
+    def _arrow(p):
+        with pa.OSFile(str(p), "wb") as f, pa.ipc.new_file(f, table.schema) as w:
+            w.write_table(table)
+    _replace(path, _arrow)
+
+def write(key: str, store: TradeStore, tabs: dict) -> str:
+    """Guarda la última lectura: filas crudas del journal (de ``store``) y del
+    resto de pestañas (``tabs``). Devuelve la versión conjunta."""
+    version = data_version(store.version, tabs)
+    rows = store.raw
+    _write_table(_path(key), _table(
+        HEADER, rows, {"_ver": pa.array([row_version(r) for r in rows], pa.string())},
+        version=version, journal=store.version))
+    for tab, trows in tabs.items():
+        _write_table(_path(key, tab), _table(TABS[tab], trows, version=version))
+    now = time.time()
+    _write_stamp(key, version=version, rows=len(rows), saved=now, checked=now)
+    return version
+
+def _open(key: str, tab: str = JOURNAL_TAB, snap_dir=None) -> pa.Table:
+    path = _path(key, tab)
+    if snap_dir is not None:
+        path = Path(snap_dir) / path.name
+    with pa.memory_map(str(path)) as src:
+        return pa.ipc.open_file(src).read_all()
+
+def read(key: str, columns=HEADER, snap_dir=None):
+    """``{version, journal: (columnas, versiones por fila, versión), tabs:
+    {pestaña: columnas}}`` o None si no hay snapshot válido (inexistente,
+    corrupto, con otra cabecera o a medio escribir por otro proceso).
+    Del journal solo se decodifican ``columns``. ``snap_dir``: otro
+    directorio que ``SNAP_DIR`` (p.ej. el CLI de reportes)."""
+    try:
+        out, tabs = None, {}
+        for tab, hdr in TABS.items():
+            t = _open(key, tab, snap_dir)
+            meta = t.schema.metadata
+            cols = [t.column(h).to_pylist()
+                    for h in (columns if tab == JOURNAL_TAB else hdr)]
+            if tab == JOURNAL_TAB:
+                out = {"version": meta[b"version"].decode(),
+                       "journal": (cols, t.column("_ver").to_pylist(),
+                                   meta[b"journal"].decode())}
+            else:
+                tabs[tab] = (cols, meta[b"version"].decode())
+        if any(v != out["version"] for _, v in tabs.values()):
+            return None
+        out["tabs"] = {tab: cols for tab, (cols, _) in tabs.items()}
+        return out
+    except (OSError, pa.ArrowException, KeyError, TypeError):
+        return None
+
+
+# ---------- stale-while-revalidate ----------
+def _from_sheet(store: TradeStore, backfill: bool, columns=None):
+    """(df del journal, filas del resto de pestañas) en un solo request."""
+    tabs = fetch_tabs(store.ws.spreadsheet, fix_headers=backfill)
+    return store.load(backfill, rows=tabs.pop(JOURNAL_TAB), columns=columns), tabs
+
+def load(store: TradeStore, key: str, backfill: bool = True, sync: bool = False,
+         max_age: float = REVALIDATE_S, columns=None):
+    """(``{pestaña: DataFrame}``, versión conjunta, leído de la hoja?).
+
+    Del snapshot si existe; si no (o con ``sync``) de la hoja, todas las
+    pestañas del registro en un request. Un snapshot con más de ``max_age``
+    s sin revisar dispara la revalidación en segundo plano. Con
+    ``backfill=False`` no se escribe nada en la hoja. ``columns``:
+    proyección del journal (p.ej. ``HOT_COLS``); sin ella, todas.
+    """
+    cols = project(columns)
+    snap = None if sync else read(key, cols)
+    if (snap is not None and backfill
+            and "" in snap["journal"][0][cols.index(ID_COL)]):
+        snap = None      # snapshot de un lector (filas sin ID): leer y asignarlos
+    if snap is None:
+        df, tabs = _from_sheet(store, backfill, columns)
+        try:
+            version = write(key, store, tabs)
+        except OSError:          # sin disco escribible se trabaja sin snapshot
+            version = data_version(store.version, tabs)
+        frames = {t: tab_frame(rows, TABS[t]) for t, rows in tabs.items()}
+        return {JOURNAL_TAB: df, **frames}, version, True
+
+    frames = {JOURNAL_TAB: store.restore(*snap["journal"], columns=cols)}
+    frames.update({t: tab_frame(list(zip(*cols)), TABS[t])
+                   for t, cols in snap["tabs"].items()})
+    info = stamp(key)
+    if info is None or time.time() - info.get("checked", 0) > max_age:
+        revalidate(store.ws, key, backfill)
+    return frames, snap["version"], False
+
+def revalidate(ws, key: str, backfill: bool = True):
+    """Relee la hoja en un hilo; reescribe el snapshot solo si cambió."""
+    with _lock:
+        if key in _inflight:
+            return
+        _inflight.add(key)
+    _touch(key)
+    threading.Thread(target=_revalidate, args=(ws, key, backfill),
+                     daemon=True).start()
+
+def _revalidate(ws, key, backfill):
+    try:
+        fresh = TradeStore(ws)
+        _, tabs = _from_sheet(fresh, backfill, [ID_COL])   # el df no se usa
+        cur = stamp(key)
+        if cur and cur.get("version") == data_version(fresh.version, tabs):
+            _touch(key)
+        else:
+            write(key, fresh, tabs)
+    except Exception:
+        pass                     # queda el snapshot anterior; se reintenta luego
+    finally:
+        with _lock:
+            _inflight.discard(key)
+
+
+# ---------- columnas frías ----------
+def fields(store: TradeStore, key: str, columns, pos=None) -> pd.DataFrame:
+    """Columnas ``columns`` de las filas en las posiciones ``pos`` (índice
+    del DataFrame del journal) o de todas, con ese mismo índice. Del
+    snapshot si corresponde a la misma lectura que ``store``; si no, de la
+    hoja por rangos de columnas (un request)."""
+    cols = [c for c in HEADER if c in columns]
+    try:
+        t = _open(key)
+        if t.schema.metadata[b"journal"].decode() != store.version:
+            raise KeyError("journal")
+        idx = range(t.num_rows)
+        if pos is not None:
+            idx = [int(p) for p in pos if 0 <= p < t.num_rows]
+            t = t.take(pa.array(idx, pa.int64()))
+        df = _frame([t.column(c).to_pylist() for c in cols], cols)
+    except (OSError, pa.ArrowException, KeyError, TypeError):
+        return store.fields(columns, pos)
+    return df.set_axis(list(idx))
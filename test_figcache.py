@@ -0,0 +1,40 @@
+# ------------------  test_figcache.py  ------------------
+"""Figuras cacheadas: ``as_figure`` depende de cómo ``st.plotly_chart``
+serializa la figura (hoy: ``to_dict()``); si Streamlit cambia eso, estos
+tests lo detectan antes que los gráficos en blanco."""
+import json
+from pathlib import Path
+from streamlit.testing.v1 import AppTest
+
+from figcache import FigureCache
+
+ROOT = str(Path(__file__).parent)
+
+
+def _app(root, cached):
+    import sys; sys.path.insert(0, root)
+    import streamlit as st, plotly.express as px
+    from figcache import FigureCache, as_figure
+    build = lambda: px.line(x=[1, 2, 3], y=[3, 1, 2], title="equity")
+    if cached:
+        spec, _ = FigureCache().get(("v1", "equity", ()), build)
+        st.plotly_chart(as_figure(spec))
+    else:
+        st.plotly_chart(build())
+
+def rendered(cached: bool) -> dict:
+    at = AppTest.from_function(_app, args=(ROOT, cached)).run()
+    assert not at.exception
+    el, = at.get("plotly_chart")
+    return json.loads(el.proto.spec)
+
+
+def test_cached_spec_renders_like_the_figure():
+    assert rendered(True) == rendered(False)
+
+def test_hit_skips_build():
+    cache, calls = FigureCache(), []
+    build = lambda: calls.append(1) or {"data": [], "layout": {}}
+    a, hit_a = cache.get(("v1", "s", ()), build)
+    b, hit_b = cache.get(("v1", "s", ()), build)
+    assert (hit_a, hit_b) == (False, True) and a == b and calls == [1]
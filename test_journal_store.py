@@ -0,0 +1,184 @@
+# ------------------  test_journal_store.py  ------------------
+"""TradeStore y fetch_tabs contra una hoja falsa en memoria (sin red)."""
+import re
+import pytest
+from gspread.exceptions import APIError
+
+import journal_store
+from journal_store import (HEADER, ID_COL, JOURNAL_TAB, IMP_TAB, TradeStore,
+                           ConflictError, fetch_tabs)
+
+ID_I = HEADER.index(ID_COL)
+
+
+def _a1(ref):
+    m = re.match(r"([A-Z]+)(\d+)", ref)
+    col = 0
+    for ch in m.group(1):
+        col = col*26 + ord(ch) - 64
+    return int(m.group(2)) - 1, col - 1
+
+
+class FakeWS:
+    """Lo justo de ``gspread.Worksheet`` que usa TradeStore."""
+
+    def __init__(self, rows):
+        self.rows = [list(map(str, r)) for r in rows]
+        self.updates = []             # un batch_update = una entrada
+
+    def get_all_values(self):
+        return [list(r) for r in self.rows]
+
+    def col_values(self, c):
+        return [r[c-1] for r in self.rows]
+
+    def batch_get(self, ranges):
+        out = []
+        for rng in ranges:
+            a, b = rng.split(":")
+            (r0, c0), (r1, c1) = _a1(a), _a1(b)
+            out.append([r[c0:c1+1] for r in self.rows[r0:r1+1]])
+        return out
+
+    def batch_update(self, data):
+        self.updates.append([d["range"] for d in data])
+        for d in data:
+            r, c = _a1(d["range"].split(":")[0])
+            for j, v in enumerate(d["values"][0]):
+                self.rows[r][c+j] = str(v)
+
+    def delete_rows(self, r):
+        del self.rows[r-1]
+
+
+def trade(tid, usd="10", **kw):
+    d = {c: "" for c in HEADER}
+    d.update({"Fecha": "2024-01-02", "Hora": "10:00:00", "Symbol": "US30",
+              "Win/Loss/BE": "Win", "USD": usd, ID_COL: tid, **kw})
+    return [d[c] for c in HEADER]
+
+@pytest.fixture
+def ws():
+    return FakeWS([HEADER, trade("T1"), trade("T2"), trade("T3")])
+
+
+# ---------- mapa ID → fila ----------
+def test_row_map(ws):
+    store = TradeStore(ws)
+    df = store.load()
+    assert [store.sheet_row(t) for t in ("T1","T2","T3")] == [2, 3, 4]
+    assert list(df[ID_COL]) == ["T1","T2","T3"]
+
+def test_backfill_assigns_and_writes_ids():
+    ws = FakeWS([HEADER, trade("T1"), trade("", usd="20")])
+    store = TradeStore(ws)
+    df = store.load()
+    tid = ws.rows[2][ID_I]
+    assert tid and df[ID_COL].iloc[1] == tid and store.sheet_row(tid) == 3
+
+def test_backfill_skips_rows_that_moved():
+    ws = FakeWS([HEADER, trade("T1"), trade("", usd="20")])
+    rows = [r[:] for r in ws.rows[1:]]
+    ws.rows.insert(1, trade("", usd="99"))        # otra sesión inserta arriba
+    TradeStore(ws).load(rows=rows)
+    assert [r[ID_I] for r in ws.rows[1:]] == ["", "T1", ""]
+    assert ws.updates == []
+
+def test_no_backfill_writes_nothing():
+    ws = FakeWS([HEADER, trade("")])
+    TradeStore(ws).load(backfill=False)
+    assert ws.updates == [] and ws.rows[1][ID_I] == ""
+
+
+# ---------- escrituras ----------
+def test_stage_coalesces_into_one_request(ws):
+    store = TradeStore(ws)
+    store.load()
+    store.stage("T2", {"Gross_USD": 50})
+    store.stage("T2", {"Commission": 4, "USD": 46})
+    store.stage("T3", {"Resolved": "Yes"})
+    assert store.commit() == 2
+    assert ws.updates == [["H3:J3", "Q4:Q4"]]
+    assert ws.rows[2][HEADER.index("USD")] == "46"
+
+def test_commit_relocates_after_insert(ws):
+    store = TradeStore(ws)
+    store.load()
+    ws.rows.insert(1, trade("T0"))                # fila nueva arriba
+    store.stage("T2", {"Resolved": "Yes"})
+    store.commit()
+    assert store.sheet_row("T2") == 4
+    assert ws.rows[3][HEADER.index("Resolved")] == "Yes"
+    assert ws.rows[2][HEADER.index("Resolved")] == ""
+
+def test_version_conflict_writes_nothing(ws):
+    store = TradeStore(ws)
+    store.load()
+    ws.rows[2][HEADER.index("USD")] = "-5"        # otra sesión editó T2
+    store.stage("T1", {"Resolved": "Yes"})
+    store.stage("T2", {"Resolved": "Yes"})
+    with pytest.raises(ConflictError) as e:
+        store.commit()
+    assert e.value.trade_ids == ["T2"] and ws.updates == []
+
+def test_stage_without_id_conflicts(ws):
+    store = TradeStore(ws)
+    store.load()
+    for tid in ("", "T9"):
+        with pytest.raises(ConflictError):
+            store.stage(tid, {"Resolved": "Yes"})
+
+def test_delete_shifts_map(ws):
+    store = TradeStore(ws)
+    store.load()
+    store.delete("T1")
+    assert [r[ID_I] for r in ws.rows[1:]] == ["T2","T3"]
+    assert store.sheet_row("T3") == 3
+    store.stage("T3", {"Resolved": "Yes"})
+    store.commit()
+    assert ws.rows[2][HEADER.index("Resolved")] == "Yes"
+
+
+# ---------- fetch_tabs ----------
+class _Resp:
+    def __init__(self, code, msg):
+        self.text, self._err = msg, {"code": code, "message": msg, "status": ""}
+    def json(self):
+        return {"error": self._err}
+
+class FakeSH:
+    """``values_batch_get`` que falla con los errores de ``fail`` en orden."""
+
+    def __init__(self, titles, fail=()):
+        self.titles, self.fail, self.calls = titles, list(fail), []
+
+    def values_batch_get(self, ranges):
+        self.calls.append("values_batch_get")
+        if self.fail:
+            raise APIError(_Resp(*self.fail.pop(0)))
+        return {"valueRanges": [{"values": [[f"{r}"]]} for r in ranges]}
+
+    def worksheets(self):
+        self.calls.append("worksheets")
+        return [type("W", (), {"title": t}) for t in self.titles]
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(journal_store.time, "sleep", lambda s: None)
+
+def test_fetch_tabs_missing_tab_falls_back(no_sleep):
+    sh = FakeSH([JOURNAL_TAB], fail=[(400, f"Unable to parse range: '{IMP_TAB}'!A1:E")])
+    out = fetch_tabs(sh)
+    assert out[IMP_TAB] == []
+    assert sh.calls == ["values_batch_get", "worksheets", "values_batch_get"]
+
+def test_fetch_tabs_retries_transient_errors(no_sleep):
+    sh = FakeSH([JOURNAL_TAB, IMP_TAB], fail=[(429, "Quota exceeded"), (503, "")])
+    fetch_tabs(sh)
+    assert sh.calls == ["values_batch_get"] * 3
+
+def test_fetch_tabs_other_errors_raise(no_sleep):
+    sh = FakeSH([JOURNAL_TAB, IMP_TAB], fail=[(403, "The caller does not have permission")])
+    with pytest.raises(APIError):
+        fetch_tabs(sh)
+    assert sh.calls == ["values_batch_get"]
@@ -0,0 +1,69 @@
+# ------------------  test_reconcile.py  ------------------
+"""Lectura del XLSX de MT5 y conciliación contra el journal."""
+import io
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from reconcile import read_mt5_report, reconcile, propose_corrections
+
+DEALS = [
+    ["2024-02-01 10:00:00", 1, "US30", "buy",  1.0, -4.0,   0.0],
+    ["2024-02-01 11:00:00", 1, "US30", "sell", 1.0,  0.0, -80.0],
+    ["2024-02-02 10:00:00", 2, "US30", "buy",  2.0, -8.0,  50.0],
+]
+
+
+def mt5_xlsx(deals=DEALS) -> bytes:
+    """Como los exporta MT5: títulos arriba, filas y celdas en blanco."""
+    wb = Workbook(); sh = wb.active
+    sh.append(["Trade History Report"])
+    sh.append([None, "Name:", "Cuenta demo"])       # columna A en blanco
+    sh.append([])
+    sh.append(["Time", "Position", "Symbol", "Type", "Volume",
+               "Commission", "Profit"])
+    for d in deals:
+        sh.append([pd.Timestamp(d[0]).to_pydatetime(), *d[1:]])
+    buf = io.BytesIO(); wb.save(buf)
+    return buf.getvalue()
+
+def journal(**over):
+    base = {"TradeID": ["a", "b"], "Ticket": [1, 2], "Win/Loss/BE": ["Win", "Win"],
+            "Volume": [1, 2], "Gross_USD": [80, 50], "Commission": [4, 8],
+            "Fecha": ["2024-02-01", "2024-02-02"], "Hora": ["10:00:00", "10:00:00"]}
+    return pd.DataFrame({**base, **over})
+
+
+def test_read_report_with_title_and_blank_rows():
+    df, missing = read_mt5_report(mt5_xlsx())
+    assert not missing
+    assert len(df) == 3
+    assert list(df["ticket"]) == [1, 1, 2]
+    assert df["profit"].sum() == pytest.approx(-30.0)
+
+def test_missing_columns_are_reported():
+    wb = Workbook(); wb.active.append(["Time", "Symbol"])
+    wb.active.append(["2024-02-01", "US30"])
+    buf = io.BytesIO(); wb.save(buf)
+    _, missing = read_mt5_report(buf.getvalue())
+    assert {"ticket", "volume", "profit", "type"} <= missing
+
+def test_sign_flip_rederives_result():
+    mt5, _ = read_mt5_report(mt5_xlsx())
+    rc = reconcile(mt5, journal())
+    assert rc["matched"] == 2
+    (tid, chg), = propose_corrections(rc["mismatched"])
+    assert tid == "a" and chg["Win/Loss/BE"] == "Loss"
+    assert chg["Gross_USD"] == -80 and chg["USD"] == -84
+
+def test_extra_only_within_report_span():
+    mt5, _ = read_mt5_report(mt5_xlsx())
+    jr = journal(TradeID=["a", "b", "c", "d"], Ticket=[1, 2, 9, 8],
+                 **{"Win/Loss/BE": ["Loss", "Win", "Win", "Win"]},
+                 Volume=[1, 2, 1, 1], Gross_USD=[-80, 50, 5, 5],
+                 Commission=[4, 8, 4, 4],
+                 Fecha=["2024-02-01", "2024-02-02", "2024-02-01", "2024-01-01"],
+                 Hora=["10:00:00"] * 4)
+    rc = reconcile(mt5, jr)
+    assert list(rc["extra"]["TradeID"]) == ["c"]
+    assert rc["mismatched"].empty
@@ -0,0 +1,67 @@
+# ------------------  test_rules.py  ------------------
+"""``RuleEngine.from_history`` debe dejar el mismo estado que ``push`` trade a trade."""
+import numpy as np, pandas as pd
+import pytest
+
+from rules import RuleEngine
+
+STATE = ["n", "equity", "peak", "day", "day_pnl", "days", "best_closed",
+         "day_hit", "dd_hit", "target_at"]
+
+
+def history(n=400, seed=0):
+    """Varios trades por día, rachas malas (pérdida diaria, DD que se
+    recupera y vuelve a romperse) y suficiente profit para los objetivos."""
+    rng = np.random.default_rng(seed)
+    dt = pd.Timestamp("2024-01-01 08:00") + pd.to_timedelta(
+        np.cumsum(rng.integers(1, 9, n)), unit="h")
+    usd = rng.normal(120, 900, n).round(2)
+    usd[100:115] = -1500.0
+    return pd.DataFrame({"Datetime": dt, "USD": usd,
+                         "Win/Loss/BE": np.where(usd > 0, "Win", "Loss")})
+
+def pushed(df, rules):
+    eng = RuleEngine(rules=rules)
+    for dt, usd in zip(df["Datetime"], df["USD"]):
+        eng.push(dt, usd)
+    return eng
+
+def assert_same(a, b):
+    for k in STATE:
+        va, vb = getattr(a, k), getattr(b, k)
+        if isinstance(va, float):
+            assert va == pytest.approx(vb), k
+        else:
+            assert va == vb, k
+    assert len(a.breaches) == len(b.breaches)
+    for x, y in zip(a.breaches, b.breaches):
+        assert {**x, "value": 0} == {**y, "value": 0}
+        assert x["value"] == pytest.approx(y["value"], abs=0.01)
+
+
+@pytest.mark.parametrize("mode", ["static", "trailing"])
+def test_from_history_matches_push(mode):
+    df = history()
+    rules = {"dd_mode": mode}
+    ref = pushed(df, rules)
+    assert ref.breaches and any(ref.target_at)    # la serie ejercita las reglas
+    assert_same(RuleEngine.from_history(df, rules=rules), ref)
+
+def test_push_continues_from_history():
+    df = history(seed=1)
+    eng = RuleEngine.from_history(df.iloc[:250], rules={"dd_mode": "trailing"})
+    for dt, usd in zip(df["Datetime"].iloc[250:], df["USD"].iloc[250:]):
+        eng.push(dt, usd)
+    assert_same(eng, pushed(df, {"dd_mode": "trailing"}))
+
+def test_from_history_skips_adj_and_undated():
+    df = history(60)
+    noise = pd.DataFrame({"Datetime": [df["Datetime"].iloc[5], pd.NaT],
+                          "USD": [-9999.0, -9999.0],
+                          "Win/Loss/BE": ["Adj", "Loss"]})
+    mixed = pd.concat([df, noise]).sample(frac=1, random_state=0)
+    assert_same(RuleEngine.from_history(mixed), pushed(df, None))
+
+def test_empty_history():
+    eng = RuleEngine.from_history(history().iloc[:0])
+    assert eng.n == 0 and eng.breaches == [] and eng.equity == eng.cap
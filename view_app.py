@@ -1,23 +1,29 @@
 # -------------- view_app.py --------------
-import streamlit as st, pandas as pd, re
+import streamlit as st, re
 from google.oauth2.service_account import Credentials
 import gspread
 from streamlit.runtime.media_file_storage import MediaFileStorageError
+from journal_store import (SHEET_KEY, JOURNAL_TAB, HOT_COLS, COLD_COLS,
+                           TradeStore)
+from panels import start_profiler, step, perf_sidebar, load_journal, fields
 
 st.set_page_config("Quantitative Journal – Galería", layout="wide")
+start_profiler("gallery")
 
 # ---------- Cargar hoja ----------
-creds = Credentials.from_service_account_info(
-    st.secrets["quantitative_journal"],
-    scopes=["https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive"])
-ws = gspread.authorize(creds)\
-        .open_by_key("1D4AlYBD1EClp0gGe0qnxr8NeGMbpSvdOx8yHimQDmbE")\
-        .worksheet("sheet1")
-df = pd.DataFrame(ws.get_all_records())
-
-if "Datetime" not in df.columns and {"Fecha","Hora"} <= set(df.columns):
-    df["Datetime"] = pd.to_datetime(df["Fecha"]+" "+df["Hora"], errors="coerce")
+@st.cache_resource(show_spinner=False)       # una vez por proceso
+def open_ws():
+    creds = Credentials.from_service_account_info(
+        st.secrets["quantitative_journal"],
+        scopes=["https://www.googleapis.com/auth/spreadsheets",
+                "https://www.googleapis.com/auth/drive"])
+    return gspread.authorize(creds)\
+            .open_by_key(SHEET_KEY)\
+            .worksheet(JOURNAL_TAB)
+
+# en memoria solo las columnas calientes; texto y URLs se piden por tarjeta
+store = TradeStore(open_ws())
+df = load_journal(store, SHEET_KEY, backfill=False, columns=HOT_COLS)[JOURNAL_TAB]
 
 if df.empty:
     st.info("No hay datos."); st.stop()
@@ -62,27 +68,31 @@ thumb_size = st.sidebar.radio("Miniatura", ["S","M","L"], index=1)
 thumb_w = dict(S=120, M=200, L=260)[thumb_size]
 
 # ---------- Aplicar filtros ----------
-if result_choice != "Todos":
-    df = df[df["Win/Loss/BE"] == result_choice]
-
-if state_choice == "Solo sin Resolver":
-    df = df[(df["Win/Loss/BE"]=="Loss") & (df["Resolved"]!="Yes")]
-elif state_choice == "Solo Resueltos":
-    df = df[(df["Win/Loss/BE"]=="Loss") & (df["Resolved"]=="Yes")]
-
-# ErrorCategory: solo filtramos si el usuario deseleccionó algo
-if sel_cats and len(sel_cats) != len(all_cats):
-    df = df[(df["ErrorCategory"].isin(sel_cats)) | (df["ErrorCategory"]=="")]
-
-# Búsqueda texto / índice
-if search_txt:
-    pattern = re.escape(search_txt.lstrip("#").lower())
-    df = df[
-        df["Idx"].astype(str).str.contains(f"^{pattern}$") |
-        df[["Symbol","Comentarios","Post-Analysis","ErrorCategory"]]
-          .apply(lambda row: row.astype(str).str.lower()
-                 .str.contains(pattern).any(), axis=1)
-    ]
+with step("filters") as rec:
+    rec["rows"] = len(df)
+    if result_choice != "Todos":
+        df = df[df["Win/Loss/BE"] == result_choice]
+
+    if state_choice == "Solo sin Resolver":
+        df = df[(df["Win/Loss/BE"]=="Loss") & (df["Resolved"]!="Yes")]
+    elif state_choice == "Solo Resueltos":
+        df = df[(df["Win/Loss/BE"]=="Loss") & (df["Resolved"]=="Yes")]
+
+    # ErrorCategory: solo filtramos si el usuario deseleccionó algo
+    if sel_cats and len(sel_cats) != len(all_cats):
+        df = df[(df["ErrorCategory"].isin(sel_cats)) | (df["ErrorCategory"]=="")]
+
+    # Búsqueda texto / índice
+    if search_txt:
+        pattern = re.escape(search_txt.lstrip("#").lower())
+        text = df.join(fields(store, SHEET_KEY, ["Comentarios","Post-Analysis"]),
+                       on="Idx")
+        df = df[
+            df["Idx"].astype(str).str.contains(f"^{pattern}$") |
+            text[["Symbol","Comentarios","Post-Analysis","ErrorCategory"]]
+              .apply(lambda row: row.astype(str).str.lower()
+                     .str.contains(pattern).any(), axis=1)
+        ]
 
 if df.empty:
     st.warning("No hay tarjetas que cumplan los filtros."); st.stop()
@@ -116,13 +126,19 @@ def safe_image(url, width):
         st.write("🖼️")
 
 # ---------- card ----------
-def card(r):
-    img_url = r["Screenshot"].split(",")[0].strip() if r["Screenshot"] else ""
+def card(r, shot):
+    img_url = str(shot).split(",")[0].strip() if shot else ""
     caption = (f"#{r['Idx']} · {r['Fecha']} · {r['Win/Loss/BE']} · "
                f"{r['USD']:+,.2f} USD · {r['R']:+.2f} R")
     safe_image(img_url, width=thumb_w); st.caption(caption)
 
-    with st.expander("Detalle"):
+    # el detalle (columnas frías) solo se pide al abrir el expander
+    with st.expander("Detalle", key=f"det_{r['Idx']}", on_change="rerun") as exp:
+        if not exp.open:
+            return
+        cold = fields(store, SHEET_KEY, COLD_COLS, [r["Idx"]])
+        r = {**dict.fromkeys(COLD_COLS, ""), **r.to_dict(),
+             **(cold.iloc[0].to_dict() if len(cold) else {})}
         for col in ["Symbol","Type","Volume","ErrorCategory",
                     "SecondTradeValid?","Comentarios","Post-Analysis",
                     "EOD","Resolved"]:
@@ -133,7 +149,11 @@ def card(r):
             st.markdown(f"[Review]({r['LossTradeReviewURL']})")
 
 # ---------- grid ----------
-cols = st.columns(N_COLS)
-for i, (_, row) in enumerate(sub.iterrows()):
-    with cols[i % N_COLS]:
-        card(row)
+with step("render:grid", rows=len(sub)):
+    shots = fields(store, SHEET_KEY, ["Screenshot"], sub["Idx"])["Screenshot"]
+    cols = st.columns(N_COLS)
+    for i, (_, row) in enumerate(sub.iterrows()):
+        with cols[i % N_COLS]:
+            card(row, shots.get(row["Idx"], ""))
+
+perf_sidebar()
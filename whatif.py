@@ -0,0 +1,168 @@
+# ------------------  whatif.py  ------------------
+"""Replay "qué hubiera pasado" del historial con otro riesgo / broker / capital.
+
+Cada escenario es (capital, riesgo %, tabla de comisiones). El tamaño de
+posición escala con el riesgo en USD (``capital * riesgo``) respecto al del
+journal, así que Gross y Volume se escalan por ese factor y la comisión se
+recalcula con la tabla por símbolo. Todos los escenarios de un bloque se
+calculan juntos como una matriz (escenarios × trades); las grillas grandes
+se reparten en bloques entre procesos.
+
+    python whatif.py            # benchmark con trades sintéticos
+"""
+import itertools, multiprocessing, os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np, pandas as pd
+
+from kpis import (INITIAL_CAP, RISK_PCT, COMMISSION_PER_LOT, DD_LIMIT_PCT,
+                  PHASE_TARGETS)
+
+JOURNAL = "journal"                  # comisión tal como está registrada
+DEFAULT_TABLES = {JOURNAL: None, f"{COMMISSION_PER_LOT:g} USD/lote": {"*": COMMISSION_PER_LOT}}
+CHUNK_CELLS = 4_000_000              # celdas (escenarios × trades) por bloque
+POOL_MIN_CHUNKS = 3                  # con menos bloques no compensa el pool
+# Streamlit corre con hilos vivos: un fork los copia a medias (locks tomados)
+START_METHOD = ("forkserver" if "forkserver" in multiprocessing.get_all_start_methods()
+                else "spawn")
+
+
+def _rates(table, symbols) -> np.ndarray:
+    """USD/lote por trade según ``{symbol: usd, "*": default}``; NaN = journal."""
+    if table is None:
+        return np.full(len(symbols), np.nan)
+    dflt = table.get("*", COMMISSION_PER_LOT)
+    return np.array([table.get(s, dflt) for s in symbols], dtype=float)
+
+def _first_at(mask: np.ndarray) -> np.ndarray:
+    """Índice del primer True por fila (-1 si no hay)."""
+    if not mask.shape[1]:
+        return np.full(len(mask), -1)
+    hit = mask.any(axis=1)
+    return np.where(hit, mask.argmax(axis=1), -1)
+
+
+def _replay_block(gross, vol, comm, rate_tab, tidx, k, cap, risk) -> dict:
+    """Métricas de un bloque de escenarios.
+
+    ``gross`` / ``vol`` / ``comm``: (n,) del journal. ``rate_tab``: (T, n)
+    USD/lote por tabla (NaN → comisión registrada); ``tidx`` elige la tabla
+    de cada escenario. ``k`` / ``cap`` / ``risk``: (S,).
+    """
+    k2 = k[:, None]
+    rates = rate_tab[tidx]                                       # (S, n)
+    c = np.where(np.isnan(rates), comm, vol * rates) * k2
+    net = gross * k2 - c
+    eq = cap[:, None] + np.cumsum(net, axis=1)
+    peak = np.maximum(np.maximum.accumulate(eq, axis=1), cap[:, None])
+    dd = (peak - eq).max(axis=1, initial=0.0)
+    out = {
+        "Net USD":     net.sum(axis=1),
+        "Comisiones":  c.sum(axis=1),
+        "R total":     net.sum(axis=1) / (cap * risk),
+        "Equity":      cap + net.sum(axis=1),
+        "Max DD USD":  dd,
+        "Max DD %":    100 * dd / cap,
+        "Quiebre DD":  _first_at(eq <= (cap * (1 - DD_LIMIT_PCT))[:, None]),
+    }
+    for i, p in enumerate(PHASE_TARGETS, 1):
+        out[f"Trades F{i}"] = _first_at(eq >= (cap * (1 + p))[:, None])
+    return out
+
+
+def _grid(capitals, risk_pcts, tables) -> pd.DataFrame:
+    return pd.DataFrame(list(itertools.product(capitals, risk_pcts, tables)),
+                        columns=["Capital", "Riesgo %", "Comisiones modelo"])
+
+def replay(df_real: pd.DataFrame, capitals=(INITIAL_CAP,), risk_pcts=(RISK_PCT,),
+           tables=None, base_cap: float = INITIAL_CAP, base_risk: float = RISK_PCT,
+           workers: int = None) -> pd.DataFrame:
+    """Una fila por escenario (capital × riesgo × tabla de comisiones).
+
+    ``tables``: ``{nombre: {symbol: USD/lote, "*": default} | None}``; None
+    usa la comisión registrada. ``base_cap`` / ``base_risk``: con qué riesgo
+    se operó el journal (define el factor de escala). ``workers``: procesos
+    para grillas grandes (0 = siempre en este proceso).
+    """
+    tables = DEFAULT_TABLES if tables is None else tables
+    d = df_real[df_real["Win/Loss/BE"] != "Adj"].sort_values("Datetime")
+    num = lambda c: pd.to_numeric(d[c], errors="coerce").fillna(0.0).to_numpy(float)
+    gross, vol, comm = num("Gross_USD"), num("Volume"), num("Commission")
+    symbols = d["Symbol"].astype(str).to_numpy()
+
+    grid = _grid(capitals, risk_pcts, tables)
+    cap  = grid["Capital"].to_numpy(float)
+    risk = grid["Riesgo %"].to_numpy(float)
+    k    = cap * risk / (base_cap * base_risk)
+    # una fila de tasas por tabla; cada escenario apunta a la suya
+    rate_tab = np.vstack([_rates(t, symbols) for t in tables.values()]
+                         or [np.empty((0, len(d)))])
+    tidx = grid["Comisiones modelo"].map({n: i for i, n in enumerate(tables)}).to_numpy(int)
+
+    # journal vacío o sin tablas: un bloque vacío, mismo esquema de salida
+    step = max(1, CHUNK_CELLS // max(1, len(d)))
+    blocks = [slice(i, i+step) for i in range(0, len(grid), step)] or [slice(0, 0)]
+    args = [(gross, vol, comm, rate_tab, tidx[b], k[b], cap[b], risk[b])
+            for b in blocks]
+
+    if workers is None:
+        workers = min(len(blocks), os.cpu_count() or 1)
+    if workers > 1 and len(blocks) >= POOL_MIN_CHUNKS:
+        ctx = multiprocessing.get_context(START_METHOD)
+        with ProcessPoolExecutor(workers, mp_context=ctx) as ex:
+            parts = list(ex.map(_replay_block, *zip(*args)))
+    else:
+        parts = [_replay_block(*a) for a in args]
+
+    out = pd.concat([grid, pd.DataFrame(
+        {c: np.concatenate([p[c] for p in parts]) for c in parts[0]})], axis=1)
+    out["Riesgo %"] = 100 * out["Riesgo %"]
+    # índice de trade → nº de trade (1-based) y su fecha; vacío si nunca llegó
+    dates = d["Datetime"].to_numpy(dtype="datetime64[ns]")
+    for c, fc in [("Quiebre DD", "Fecha quiebre"),
+                  *((f"Trades F{i}", f"Fecha F{i}")
+                    for i in range(1, len(PHASE_TARGETS)+1))]:
+        idx = out[c].to_numpy(); hit = idx >= 0
+        fecha = np.full(len(idx), np.datetime64("NaT"), dtype="datetime64[ns]")
+        fecha[hit] = dates[idx[hit]]
+        out[fc] = fecha
+        out[c] = pd.Series(idx + 1, dtype="Int64").mask(~hit)
+    flt = out.select_dtypes("float").columns
+    out[flt] = out[flt].round(2)
+    return out
+
+
+def parse_list(txt: str, scale: float = 1.0) -> list:
+    """"0.25, 0.5; 1" → [0.0025, 0.005, 0.01] con ``scale=0.01``."""
+    vals = [v for v in txt.replace(";", ",").split(",") if v.strip()]
+    return [float(v) * scale for v in vals]
+
+def tables_from_frame(tab: pd.DataFrame) -> dict:
+    """Tabla editable (Modelo, Symbol, USD/lote) → ``{modelo: {symbol: usd}}``."""
+    out = {}
+    for r in tab.dropna(subset=["Modelo", "USD/lote"]).to_dict("records"):
+        sym = str(r.get("Symbol") or "*").strip() or "*"
+        out.setdefault(str(r["Modelo"]).strip(), {})[sym] = float(r["USD/lote"])
+    return out
+
+
+if __name__ == "__main__":
+    import time
+    rng = np.random.default_rng(0)
+    n = 50_000
+    res = rng.choice(["Win", "Loss", "BE"], n, p=[.4, .5, .1])
+    vol = rng.uniform(.5, 3, n).round(2)
+    df = pd.DataFrame({
+        "Datetime": pd.date_range("2020-01-01", periods=n, freq="9h"),
+        "Symbol": rng.choice(["EURUSD", "XAUUSD", "NAS100"], n),
+        "Win/Loss/BE": res, "Volume": vol, "Commission": vol*4,
+        "Gross_USD": np.where(res == "Win", rng.uniform(150, 600, n),
+                              np.where(res == "Loss", -150.0, 0.0))})
+    tables = {JOURNAL: None, "flat 3": {"*": 3.0},
+              "broker B": {"*": 5.0, "XAUUSD": 7.0, "NAS100": 1.5}}
+    caps  = [25_000, 50_000, 60_000, 100_000, 200_000]
+    risks = list(np.linspace(0.001, 0.02, 40))
+    for w in (0, None):
+        t0 = time.perf_counter()
+        out = replay(df, caps, risks, tables, workers=w)
+        print(f"{len(out)} escenarios × {n} trades, workers={w}: "
+              f"{time.perf_counter()-t0:.3f}s")